@@ -0,0 +1,81 @@
+'''
+Author: Wh_Xcjm
+Date: 2026-10-18 14:52:04
+LastEditor: Wh_Xcjm
+LastEditTime: 2026-10-18 14:52:04
+FilePath: \大作业\gui\frame_stats.py
+Description: 
+
+Copyright (c) 2025 by WhXcjm, All Rights Reserved. 
+Github: https://github.com/WhXcjm
+'''
+import time
+from collections import deque
+
+
+class FrameStats():
+    """
+    预览窗口的帧时间统计：每帧 paintGL 的 CPU 耗时、帧率与掉帧数，保留最近 window 帧
+    :param refresh_rate: 显示器刷新率，两帧间隔超过 1.5 个刷新周期时计为掉帧
+    """
+    def __init__(self, window=120, refresh_rate=60.0):
+        self.refresh_rate = refresh_rate
+        self.cpu_times = deque(maxlen=window)  # 秒
+        self.intervals = deque(maxlen=window)  # 相邻两帧呈现的间隔（秒）
+        self.frames = 0
+        self.dropped = 0
+        self.frame_start = None
+        self.last_presented = None
+
+    def begin_frame(self):
+        self.frame_start = time.perf_counter()
+
+    def end_frame(self):
+        if self.frame_start is not None:
+            self.cpu_times.append(time.perf_counter() - self.frame_start)
+            self.frame_start = None
+
+    def frame_presented(self, animating):
+        """
+        一帧已交换到屏幕
+        :param animating: 是否处于连续动画（自动旋转）中，按需重绘时的长间隔不计入帧率与掉帧
+        """
+        now = time.perf_counter()
+        self.frames += 1
+        if animating and self.last_presented is not None:
+            interval = now - self.last_presented
+            self.intervals.append(interval)
+            missed = round(interval * self.refresh_rate) - 1
+            if interval > 1.5 / self.refresh_rate and missed > 0:
+                self.dropped += missed
+        self.last_presented = now if animating else None
+
+    @property
+    def fps(self):
+        total = sum(self.intervals)
+        return len(self.intervals) / total if total > 0 else 0.0
+
+    def summary(self):
+        """
+        :return: {'fps', 'cpu_ms', 'cpu_ms_max', 'dropped', 'frames'}，cpu_ms 为最近若干帧 paintGL 的平均耗时
+        """
+        cpu = list(self.cpu_times)
+        return {
+            'fps': self.fps,
+            'cpu_ms': 1000 * sum(cpu) / len(cpu) if cpu else 0.0,
+            'cpu_ms_max': 1000 * max(cpu) if cpu else 0.0,
+            'dropped': self.dropped,
+            'frames': self.frames,
+        }
+
+    def text(self):
+        stats = self.summary()
+        return (f"{stats['fps']:.1f} fps | paintGL {stats['cpu_ms']:.2f} ms (max {stats['cpu_ms_max']:.2f}) | "
+                f"dropped {stats['dropped']} / {stats['frames']}")
+
+    def reset(self):
+        self.cpu_times.clear()
+        self.intervals.clear()
+        self.frames = 0
+        self.dropped = 0
+        self.last_presented = None
@@ -0,0 +1,37 @@
+'''
+Author: Wh_Xcjm
+Date: 2026-10-18 14:43:47
+LastEditor: Wh_Xcjm
+LastEditTime: 2026-10-18 15:08:11
+FilePath: \大作业\gui\import_thread.py
+Description: 
+
+Copyright (c) 2025 by WhXcjm, All Rights Reserved. 
+Github: https://github.com/WhXcjm
+'''
+from PySide6.QtCore import QThread, Signal
+from model.shape_generator import ShapeGenerator
+from utils.logger import logger
+
+
+class ImportThread(QThread):
+    """
+    在后台线程中读取 OBJ 文件，避免大模型导入时界面卡顿
+    """
+    progress = Signal(int)  # 百分比
+    imported = Signal(object)  # 导入的物体
+    failed = Signal(str)
+
+    def __init__(self, filename, id=None):
+        super().__init__()
+        self.filename = filename
+        self.id = id
+
+    def run(self):
+        try:
+            obj = ShapeGenerator.load_obj(self.filename, progress=lambda fraction: self.progress.emit(int(fraction * 100)), id=self.id)
+        except Exception as e:
+            logger.debug(f"Import of {self.filename} raised {e!r}")
+            self.failed.emit(str(e))
+            return
+        self.imported.emit(obj)
@@ -9,14 +9,17 @@ Description:
 Copyright (c) 2025 by WhXcjm, All Rights Reserved. 
 Github: https://github.com/WhXcjm
 '''
-from PySide6.QtWidgets import QMainWindow, QVBoxLayout, QHBoxLayout, QPushButton, QTableWidget, QTableWidgetItem, QWidget, QFileDialog, QHeaderView, QDialog, QLabel, QProgressBar, QSizePolicy
+from PySide6.QtWidgets import QMainWindow, QVBoxLayout, QHBoxLayout, QPushButton, QWidget, QFileDialog, QDialog, QLabel, QProgressBar, QSizePolicy, QMessageBox
 from PySide6.QtGui import QIcon, QImage, QPixmap
 from PySide6.QtCore import Qt, QThread
 from gui.preview_widget import PreviewWidget
 from gui.add_shape import AddShapeDialog, add_shape_to_scene
 from gui.transform import TransformConfigDialog
+from gui.import_thread import ImportThread
+from gui.object_list import ObjectListModel, ObjectListView
 from model.shape_generator import ShapeGenerator
-from render.render import RenderThread
+from model.scene_io import save_scene, load_scene
+from render.render import RenderJob, RenderPool
 from utils.logger import logger
 import matplotlib.pyplot as plt
 import glm, os
@@ -53,27 +56,29 @@ class MainWindow(QMainWindow):
 		right_layout = QVBoxLayout()
 
 		# 物体列表
-		self.object_list = QTableWidget()
-		self.object_list.setColumnCount(3)
-		self.object_list.setHorizontalHeaderLabels(["Name", "Appearance","More"])
-		self.object_list.horizontalHeader().setSectionResizeMode(0,QHeaderView.ResizeMode.ResizeToContents)
-		self.object_list.horizontalHeader().setSectionResizeMode(1,QHeaderView.ResizeMode.Stretch)
-		self.object_list.horizontalHeader().setSectionResizeMode(2,QHeaderView.ResizeMode.ResizeToContents)
+		self.scene_objects = []
+		self.object_model = ObjectListModel(self.scene_objects)
+		self.object_list = ObjectListView(self.object_model)
+		self.object_list.transform_requested.connect(self.show_transform_dialog)
+		self.object_list.delete_requested.connect(self.delete_object)
 		right_layout.addWidget(self.object_list)
 
 		# 添加功能按钮
-		self.import_button = QPushButton("Import Object")
-		self.export_button = QPushButton("Export Object")
+		self.import_button = QPushButton("Import")
+		self.export_button = QPushButton("Export Scene")
 		self.reset_button = QPushButton("Reset View")
 		self.render_button = QPushButton("Render")
 		self.add_shape_button = QPushButton("Add Shape")
 		self.rotate_button = QPushButton("Start Rotation")
+		self.ray_traced_button = QPushButton("Ray Traced View")
+		self.ray_traced_button.setCheckable(True)
 
 		right_layout.addWidget(self.add_shape_button)
 		right_layout.addWidget(self.import_button)
 		right_layout.addWidget(self.export_button)
 		right_layout.addWidget(self.rotate_button)
 		right_layout.addWidget(self.reset_button)
+		right_layout.addWidget(self.ray_traced_button)
 		right_layout.addWidget(self.render_button)
 
 		# 进度条
@@ -120,95 +125,48 @@ class MainWindow(QMainWindow):
 		self.render_button.clicked.connect(self.render_scene)
 		self.add_shape_button.clicked.connect(self.add_shape)
 		self.rotate_button.clicked.connect(self.toggle_rotation)
+		self.ray_traced_button.toggled.connect(self.preview.set_ray_traced)
+		self.preview.ray_traced_changed.connect(self.ray_traced_button.setChecked)  # F4 切换时同步按钮状态
 
-		# 初始化物体列表
-		self.scene_objects = []
-		self.update_object_list()
+		self.render_pool = RenderPool()  # 常驻渲染进程池，首次渲染时启动，在多次渲染间复用
+		self.render_job = RenderJob(self.render_pool)  # 渲染任务，再次点击 Render 时取消当前渲染并以新的相机重新渲染
+		self.render_job.progress_update.connect(self.on_progress_update)
+		self.render_job.finished.connect(self.on_render_finished)
+		self.render_job.status_changed.connect(self.on_render_status_changed)
+		self.render_window = None
 
 		self.is_rotating = False  # 旋转状态
-		self.object_list.cellChanged.connect(self.handle_name_change)
-
-	def handle_name_change(self, row, column):
-		"""
-		处理名称修改时更新物体名称。
-		"""
-		if column == 0:  # 只处理第一列的修改
-			item = self.object_list.item(row, 0)
-			if item:
-				new_name = item.text()
-				# 找到对应物体并更新名称
-				obj = self.scene_objects[row]
-				obj.name = new_name
-				self.update_object_list()  # 刷新列表显示新的名称
 
 	def update_object_list(self):
 		"""
-		更新 GUI 列表并同步预览窗口
+		整体刷新 GUI 列表并同步预览窗口（场景被整体替换时使用）
 		"""
-		self.object_list.blockSignals(True)  # 阻止信号触发
-		for row in range(self.object_list.rowCount()):
-			self.object_list.removeRow(row)
-		self.object_list.setRowCount(0)
-		
 		# 删除无用物体，注意避免内存泄漏
-		to_remove = []
-		for obj in self.scene_objects:
-			if getattr(obj, 'removed', False):
-				to_remove.append(obj)
-		for obj in to_remove:
-			self.scene_objects.remove(obj)
-			del obj
-		
-		for obj in self.scene_objects:
-			row = self.object_list.rowCount()
-			self.object_list.insertRow(row)
-			self.object_list.setItem(row, 0, QTableWidgetItem(obj.name))
-			appearance = f"Texture: \"{obj.texture}\"" if obj.texture else f"Color: {obj.color}"
-			appearance_item = QTableWidgetItem(appearance)
-			appearance_item.setTextAlignment(Qt.AlignLeft | Qt.AlignVCenter)
-			appearance_item.setToolTip(appearance)  # 鼠标悬停时显示完整内容
-			appearance_item.setFlags(appearance_item.flags() & ~Qt.ItemIsEditable)
-			self.object_list.setItem(row, 1, appearance_item)
-			
-			button_widget = QWidget()
-			button_layout = QHBoxLayout()
-			button_layout.setSpacing(0)
-			button_layout.setContentsMargins(0, 0, 0, 0)
-			
-			more_button = QPushButton("Trans")
-			# more_button.setMinimumWidth(28)
-			more_button.setMaximumWidth(50)
-			more_button.clicked.connect(lambda _, o=obj: self.show_transform_dialog(o))
-			button_layout.addWidget(more_button)
-
-			del_button = QPushButton("Del")
-			# del_button.setMinimumWidth(28)
-			del_button.setMaximumWidth(50)
-			del_button.clicked.connect(lambda _, o=obj: self.delete_object(o))
-			button_layout.addWidget(del_button)
-			
-			more_button.setStyleSheet("padding-top: 5px; padding-bottom: 5px; margin-top: 0px; margin-bottom: 0px; padding-left: 5px; padding-right: 5px")
-			del_button.setStyleSheet("padding-top: 5px; padding-bottom: 5px; margin-top: 0px; margin-bottom: 0px; padding-left: 5px; padding-right: 5px")
-
-			button_widget = QWidget()
-			button_widget.setLayout(button_layout)
-			self.object_list.setCellWidget(row, 2, button_widget)
-
-		self.object_list.blockSignals(False)  # 阻止信号触发
+		self.scene_objects[:] = [obj for obj in self.scene_objects if not getattr(obj, 'removed', False)]
+		self.object_model.reset(self.scene_objects)
 		self.preview.update_objects(self.scene_objects)
 
 	def delete_object(self, obj):
 		obj.removed = True
-		self.update_object_list()
+		self.object_model.remove_object(obj)
+		self.preview.update_objects(self.scene_objects)
 	
 	def show_transform_dialog(self, obj):
 		"""
 		显示平移、旋转和缩放设置对话框，并根据修改更新 transform。
 		"""
 		# 创建并展示 TransformConfigDialog 对话框
-		dialog = TransformConfigDialog(obj, callback=self.update_object_list, parent=self)
+		dialog = TransformConfigDialog(obj, callback=self.on_object_changed, parent=self)
 
 		dialog.show()
+
+	def on_object_changed(self, obj, properties):
+		"""
+		单个物体的属性发生变化，只通知预览与物体列表更新该物体，不重建物体列表
+		:param properties: 发生变化的属性名集合
+		"""
+		self.object_model.object_changed(obj, properties)
+		self.preview.object_changed(obj, properties)
 			
 	def toggle_rotation(self):
 		"""
@@ -227,39 +185,79 @@ class MainWindow(QMainWindow):
 		添加物体到场景
 		"""
 		self.scene_objects.append(obj)
-		self.update_object_list()
+		self.object_model.object_added(obj)
+		self.preview.update_objects(self.scene_objects)
 
 	def import_object(self):
 		"""
-		导入 .obj 文件
+		导入场景文件（.mrs，替换当前场景）或 .obj 文件（加入当前场景）
 		"""
-		filename, _ = QFileDialog.getOpenFileName(self, "Import Object", "", "OBJ Files (*.obj)")
-		if filename:
+		filename, _ = QFileDialog.getOpenFileName(self, "Import", "", "Scene Files (*.mrs);;OBJ Files (*.obj)")
+		if filename.lower().endswith('.mrs'):
+			self.import_scene(filename)
+		elif filename:
 			logger.info(f"Importing object from {filename}")
-			try:
-				vertices, faces = ShapeGenerator.load_obj(filename)
-				obj_name = f"Imported_{len(self.scene_objects)}"
-				transform = glm.mat4(1.0)
-				self.scene_objects.append({
-					"name": obj_name,
-					"vertices": vertices,
-					"transform": transform,
-					"color": (1.0, 1.0, 1.0)  # 默认白色
-				})
-				self.update_object_list()
-				logger.info(f"Successfully imported object: {obj_name}")
-			except Exception as e:
-				logger.error(f"Failed to import object: {e}")
+			self.import_button.setEnabled(False)
+			self.progress_bar.setVisible(True)
+			self.progress_bar.setValue(0)
+			self.import_thread = ImportThread(filename, id=AddShapeDialog().get_next_shape_id())
+			self.import_thread.progress.connect(self.progress_bar.setValue)
+			self.import_thread.imported.connect(self.on_object_imported)
+			self.import_thread.failed.connect(self.on_import_failed)
+			self.import_thread.start()
+
+	def on_object_imported(self, obj):
+		"""
+		OBJ 文件读取完成，加入场景
+		"""
+		self.import_button.setEnabled(True)
+		self.progress_bar.setVisible(False)
+		self.add_object(obj)
+		logger.info(f"Successfully imported object: {obj.name}")
+
+	def on_import_failed(self, message):
+		logger.error(f"Failed to import {self.import_thread.filename}: {message}")
+		self.import_button.setEnabled(True)
+		self.progress_bar.setVisible(False)
+		QMessageBox.warning(self, "Import Failed", f"Failed to import {os.path.basename(self.import_thread.filename)}:\n{message}")
+
+	def import_scene(self, filename):
+		"""
+		打开场景文件，替换当前场景中的物体，并恢复保存时的视角与光源
+		"""
+		logger.info(f"Importing scene from {filename}")
+		try:
+			objects, properties, light = load_scene(filename)
+		except Exception as e:
+			logger.error(f"Failed to import scene {filename}: {e}")
+			QMessageBox.warning(self, "Import Failed", f"Failed to import {os.path.basename(filename)}:\n{e}")
+			return
+		self.scene_objects = objects
+		# 之后新建的物体从场景中最大的 id 之后编号（get_next_shape_id 先自增再返回）
+		AddShapeDialog.shape_id_counter = max((obj.id for obj in objects if isinstance(obj.id, int)), default=0)
+		self.render_job.accel = None
+		if properties is not None:
+			self.properties.update(properties)
+			self.preview.original_eye = properties['eye']
+			self.preview.original_center = properties['center']
+		if light is not None:
+			self.preview.light_pos = light['position']
+		self.preview.reset_view()
+		self.update_object_list()
+		logger.info(f"Successfully imported scene with {len(objects)} objects")
 
 	def export_object(self):
 		"""
-		导出当前场景到 .obj 文件
+		导出当前场景（物体、视角与光源）到场景文件
 		"""
-		filename, _ = QFileDialog.getSaveFileName(self, "Export Object", "", "OBJ Files (*.obj)")
+		filename, _ = QFileDialog.getSaveFileName(self, "Export Scene", "", "Scene Files (*.mrs)")
 		if filename:
+			if not filename.lower().endswith('.mrs'):
+				filename += '.mrs'
 			logger.info(f"Exporting scene to {filename}")
 			try:
-				self.preview.export_scene_to_obj(filename)
+				properties = dict(self.properties, eye=self.preview.eye, center=self.preview.center)
+				save_scene(filename, self.scene_objects, properties, {'position': self.preview.light_pos, 'color': glm.vec3(1.0, 1.0, 1.0)})
 				logger.info("Scene exported successfully")
 			except Exception as e:
 				logger.error(f"Failed to export scene: {e}")
@@ -274,11 +272,13 @@ class MainWindow(QMainWindow):
 
 	def render_scene(self):
 		"""
-		渲染当前场景
+		渲染当前场景，渲染窗口仍打开时取消当前渲染并在原窗口中重新渲染
 		"""
 		logger.info("Starting rendering process")
-		self.render_button.setEnabled(False)
 		self.progress_bar.setVisible(True)
+		if self.render_window is not None and self.render_window.isVisible():
+			self.start_rendering()
+			return
 		self.progress_bar.setValue(0)
 
 		# 创建新的窗口来展示渲染效果
@@ -317,6 +317,11 @@ class MainWindow(QMainWindow):
 		# 设置大小策略为扩展
 		self.render_image_label.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
 		self.render_window_layout.addWidget(self.render_image_label)
+		# 渐进渲染：随时可以停止细化，保留当前结果
+		self.stop_render_button = QPushButton("Stop Refining")
+		self.stop_render_button.clicked.connect(self.stop_rendering)
+		self.render_window_layout.addWidget(self.stop_render_button)
+		self.render_window.rejected.connect(self.cancel_rendering)
 		self.render_window.setLayout(self.render_window_layout)
 		self.render_window.show()
 		self.render_image = np.zeros((self.render_height, self.render_width, 3))
@@ -335,13 +340,27 @@ class MainWindow(QMainWindow):
 		
 		self.properties['eye'] = self.preview.auto_eye
 		self.properties['center'] = self.preview.center
-		self.render_thread = RenderThread(self.scene_objects, self.properties, self.render_width, height=self.render_height, light_pos=self.preview.light_pos)
-		self.render_thread.ray_tracer.signals.progress_update.connect(self.on_progress_update)
-		self.render_thread.ray_tracer.signals.finished.connect(self.on_render_finished)
-
-		# 启动渲染线程
-		self.render_thread.start()
+		self.render_job.restart(objects=self.scene_objects, properties=dict(self.properties), width=self.render_width, height=self.render_height, light_pos=self.preview.light_pos, progressive=True)
+		self.stop_render_button.setEnabled(True)
+		self.render_window.setWindowTitle("Rendering...")
 	
+	def stop_rendering(self):
+		"""
+		停止渐进渲染的后续细化
+		"""
+		if self.render_job.active:
+			logger.info("Stopping progressive rendering")
+			self.render_job.stop()
+		self.stop_render_button.setEnabled(False)
+
+	def cancel_rendering(self):
+		"""
+		关闭渲染窗口时取消渲染，不保存结果
+		"""
+		if self.render_job.active:
+			logger.info("Cancelling rendering")
+			self.render_job.cancel()
+
 	def on_progress_update(self, progress, image_data):
 		"""
 		更新进度条和渲染图像
@@ -359,11 +378,11 @@ class MainWindow(QMainWindow):
 		self.render_image_label.setPixmap(pixmap)
 		self.render_image_label.repaint()
 
-	def on_render_finished(self):
+	def on_render_finished(self, ray_tracer):
 		"""
 		渲染完成后的处理
 		"""
-		self.render_button.setEnabled(True)
+		self.stop_render_button.setEnabled(False)
 		# self.progress_bar.setVisible(False)
 		# 从 image.png 文件中读取图像并显示在 QLabel 中
 		image_path = "image.png"
@@ -375,6 +394,25 @@ class MainWindow(QMainWindow):
 			self.render_image_label.setPixmap(pixmap)
 		self.render_window.setWindowTitle("Render Finished")
 
+	def on_render_status_changed(self, status):
+		if status == 'cancelled':
+			self.progress_bar.setVisible(False)
+			if self.render_window is not None:
+				self.render_window.setWindowTitle("Render Cancelled")
+
+	def closeEvent(self, event):
+		"""
+		关闭窗口时取消正在进行的渲染、等待导入结束，并关闭常驻渲染进程池
+		"""
+		self.render_job.cancel()
+		self.render_job.wait()
+		self.preview.close_ray_tracing()
+		import_thread = getattr(self, 'import_thread', None)
+		if import_thread is not None:
+			import_thread.wait()
+		self.render_pool.close()
+		super().closeEvent(event)
+
 	def add_shape(self):
 		self.add_shape_dialog = AddShapeDialog(self)
 		self.add_shape_dialog.finished.connect(self.handle_add_shape_dialog_finished)
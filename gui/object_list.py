@@ -0,0 +1,183 @@
+'''
+Author: Wh_Xcjm
+Date: 2026-10-18 14:54:38
+LastEditor: Wh_Xcjm
+LastEditTime: 2026-10-18 15:08:31
+FilePath: \大作业\gui\object_list.py
+Description: 
+
+Copyright (c) 2025 by WhXcjm, All Rights Reserved. 
+Github: https://github.com/WhXcjm
+'''
+from PySide6.QtWidgets import QTableView, QHeaderView, QStyledItemDelegate, QStyleOptionButton, QStyle, QApplication
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex, QRect, QEvent, Signal
+
+NAME_COLUMN, APPEARANCE_COLUMN, ACTIONS_COLUMN = range(3)
+DISPLAYED_PROPERTIES = {'name', 'color', 'texture'}  # 列表中显示的物体属性
+ACTIONS = ("Trans", "Del")
+
+
+def appearance_text(obj):
+    return f"Texture: \"{obj.texture}\"" if obj.texture else f"Color: {obj.color}"
+
+
+class ObjectListModel(QAbstractTableModel):
+    """
+    场景物体列表的数据模型，直接引用场景的物体列表。
+    视图只为可见的行取数据，物体增删或属性变化时发出对应行的信号，不重建整个列表
+    """
+    def __init__(self, objects, parent=None):
+        super().__init__(parent)
+        self.objects = objects
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.objects)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else 3
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return ("Name", "Appearance", "More")[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        obj = self.objects[index.row()]
+        column = index.column()
+        if column == NAME_COLUMN and role in (Qt.DisplayRole, Qt.EditRole):
+            return obj.name
+        if column == APPEARANCE_COLUMN:
+            if role in (Qt.DisplayRole, Qt.ToolTipRole):  # 鼠标悬停时显示完整内容
+                return appearance_text(obj)
+            if role == Qt.TextAlignmentRole:
+                return int(Qt.AlignLeft | Qt.AlignVCenter)
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if index.isValid() and index.column() == NAME_COLUMN and role == Qt.EditRole:
+            self.objects[index.row()].name = value
+            self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
+            return True
+        return False
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.column() == NAME_COLUMN:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def reset(self, objects):
+        """
+        整体替换物体列表（如打开场景文件）
+        """
+        self.beginResetModel()
+        self.objects = objects
+        self.endResetModel()
+
+    def object_added(self, obj):
+        """
+        物体已追加到列表末尾
+        """
+        row = len(self.objects) - 1
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.endInsertRows()
+
+    def remove_object(self, obj):
+        """
+        从列表中删除物体
+        """
+        row = self.objects.index(obj)
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.objects[row]
+        self.endRemoveRows()
+
+    def object_changed(self, obj, properties):
+        """
+        物体的属性发生变化，名称或外观变化时只刷新对应行
+        :param properties: 发生变化的属性名集合
+        """
+        if not properties & DISPLAYED_PROPERTIES:
+            return
+        row = self.objects.index(obj)
+        self.dataChanged.emit(self.index(row, NAME_COLUMN), self.index(row, APPEARANCE_COLUMN))
+
+
+class ActionButtonDelegate(QStyledItemDelegate):
+    """
+    在单元格中绘制 Trans / Del 按钮，不为每一行创建按钮控件
+    """
+    clicked = Signal(int, str)  # 行号, 按钮文本
+
+    button_width = 50
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pressed = None  # 按下的 (行号, 按钮文本)，松开时在同一按钮上才算点击
+
+    def button_rects(self, rect):
+        return [QRect(rect.x() + i * self.button_width, rect.y(), self.button_width, rect.height())
+                for i in range(len(ACTIONS))]
+
+    def paint(self, painter, option, index):
+        style = option.widget.style() if option.widget else QApplication.style()
+        for text, rect in zip(ACTIONS, self.button_rects(option.rect)):
+            button = QStyleOptionButton()
+            button.rect = rect.adjusted(1, 1, -1, -1)
+            button.text = text
+            button.state = QStyle.State_Enabled | (QStyle.State_Sunken if self.pressed == (index.row(), text) else QStyle.State_Raised)
+            style.drawControl(QStyle.CE_PushButton, button, painter, option.widget)
+
+    def sizeHint(self, option, index):
+        size = super().sizeHint(option, index)
+        size.setWidth(self.button_width * len(ACTIONS))
+        return size
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() not in (QEvent.MouseButtonPress, QEvent.MouseButtonRelease) or event.button() != Qt.LeftButton:
+            return False
+        hit = None
+        for text, rect in zip(ACTIONS, self.button_rects(option.rect)):
+            if rect.contains(event.position().toPoint()):
+                hit = (index.row(), text)
+        if event.type() == QEvent.MouseButtonPress:
+            self.pressed = hit
+        else:
+            pressed, self.pressed = self.pressed, None
+            if hit is not None and hit == pressed:
+                self.clicked.emit(*hit)
+        if option.widget is not None:
+            option.widget.viewport().update(option.rect)  # 重绘按钮的按下状态
+        return hit is not None
+
+
+class ObjectListView(QTableView):
+    """
+    物体列表视图：固定行高，列宽不按全部内容计算，物体数量很大时仍只处理可见的行
+    """
+    transform_requested = Signal(object)
+    delete_requested = Signal(object)
+
+    def __init__(self, model, parent=None):
+        super().__init__(parent)
+        self.setModel(model)
+        self.actions_delegate = ActionButtonDelegate(self)
+        self.actions_delegate.clicked.connect(self.handle_action)
+        self.setItemDelegateForColumn(ACTIONS_COLUMN, self.actions_delegate)
+
+        header = self.horizontalHeader()
+        header.setResizeContentsPrecision(100)  # 名称列按前 100 行估计宽度
+        header.setSectionResizeMode(NAME_COLUMN, QHeaderView.ResizeMode.ResizeToContents)
+        header.setSectionResizeMode(APPEARANCE_COLUMN, QHeaderView.ResizeMode.Stretch)
+        header.setSectionResizeMode(ACTIONS_COLUMN, QHeaderView.ResizeMode.Fixed)
+        header.resizeSection(ACTIONS_COLUMN, ActionButtonDelegate.button_width * len(ACTIONS))
+        self.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.setWordWrap(False)
+
+    def handle_action(self, row, text):
+        obj = self.model().objects[row]
+        if text == "Trans":
+            self.transform_requested.emit(obj)
+        else:
+            self.delete_requested.emit(obj)
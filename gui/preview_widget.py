@@ -1,22 +1,153 @@
 from PySide6.QtOpenGLWidgets import QOpenGLWidget
-from PySide6.QtGui import QMouseEvent
-from PySide6.QtCore import Qt, QTimer, QPoint
+from PySide6.QtGui import QMouseEvent, QPainter, QColor
+from PySide6.QtCore import Qt, QTimer, QPoint, Signal
 from OpenGL.GL import *
 from OpenGL.GLU import *
 import glm
 import numpy as np
+import time
 from OpenGL.GL import shaders
+from gui.frame_stats import FrameStats
+from render.render import RenderJob, RenderPool
 from utils.logger import logger
 
 
+# 着色器中 Frame 统一块的绑定点与大小（std140：mat4 占 16 个 float，每个 vec3 按 4 个 float 对齐）
+FRAME_BLOCK_BINDING = 0
+FRAME_BLOCK_FLOATS = 16 + 3 * 4
+
+# 每个实例的数据：模型矩阵（16，按列存储）| 颜色（3，补齐到 4）
+INSTANCE_FLOATS = 20
+INSTANCE_MODEL_LOCATION = 3  # mat4 占用 3 ~ 6 四个属性位置
+INSTANCE_COLOR_LOCATION = 7
+
+
+class ShaderProgram():
+    """
+    编译链接后的着色器程序。链接时一次性查询全部 uniform 的位置，绘制时不再按名称查找
+    """
+    def __init__(self, vertex_shader, fragment_shader):
+        vs = shaders.compileShader(vertex_shader, GL_VERTEX_SHADER)
+        fs = shaders.compileShader(fragment_shader, GL_FRAGMENT_SHADER)
+        self.program = shaders.compileProgram(vs, fs)
+
+        self.uniforms = {}
+        for index in range(glGetProgramiv(self.program, GL_ACTIVE_UNIFORMS)):
+            name = glGetActiveUniform(self.program, index)[0].decode()
+            location = glGetUniformLocation(self.program, name)
+            if location >= 0:  # 统一块中的成员没有单独的位置
+                self.uniforms[name] = location
+
+    def location(self, name):
+        """
+        :return: uniform 的位置，被编译器优化掉的 uniform 返回 -1（对其赋值不产生效果）
+        """
+        return self.uniforms.get(name, -1)
+
+    def use(self):
+        glUseProgram(self.program)
+
+
+def mesh_key(obj):
+    return (id(obj.vertices), id(obj.normals), id(obj.indices), id(obj.texcoords))
+
+
+class MeshBuffers():
+    """
+    一个网格在显存中的顶点数组对象（VAO）、顶点缓冲（VBO）与索引缓冲（EBO），创建时上传一次，之后每帧直接绘制。
+    VAO 同时记录了实例属性在实例缓冲 instance_vbo 中的位置，使用该网格的全部物体以一次实例化绘制完成
+    """
+    def __init__(self, vertices, normals, indices, texcoords, instance_vbo):
+        self.arrays = (vertices, normals, indices, texcoords)  # 保持数组存活，避免 id 被复用
+        self.count = np.size(indices)
+
+        self.vao = glGenVertexArrays(1)
+        glBindVertexArray(self.vao)
+
+        # 创建 VBO 并上传顶点和纹理数据
+        self.vbo = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        data = np.hstack((vertices, normals, texcoords)).astype(np.float32)
+        glBufferData(GL_ARRAY_BUFFER, data.nbytes, data, GL_STATIC_DRAW)
+
+        # 配置顶点属性
+        glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE,
+                              8 * 4, ctypes.c_void_p(0))
+        glEnableVertexAttribArray(0)
+
+        glVertexAttribPointer(1, 3, GL_FLOAT, GL_FALSE,
+                              8 * 4, ctypes.c_void_p(12))
+        glEnableVertexAttribArray(1)
+
+        glVertexAttribPointer(2, 2, GL_FLOAT, GL_FALSE,
+                              8 * 4, ctypes.c_void_p(24))
+        glEnableVertexAttribArray(2)
+
+        # 创建 EBO 并上传索引数据，EBO 绑定记录在 VAO 中
+        self.ebo = glGenBuffers(1)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+        indices = np.ascontiguousarray(indices, dtype=np.uint32)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER,
+                     indices.nbytes, indices, GL_STATIC_DRAW)
+
+        # 实例属性：每个实例前进一次
+        glBindBuffer(GL_ARRAY_BUFFER, instance_vbo)
+        stride = INSTANCE_FLOATS * 4
+        for column in range(4):
+            location = INSTANCE_MODEL_LOCATION + column
+            glVertexAttribPointer(location, 4, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(column * 16))
+            glEnableVertexAttribArray(location)
+            glVertexAttribDivisor(location, 1)
+        glVertexAttribPointer(INSTANCE_COLOR_LOCATION, 3, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(64))
+        glEnableVertexAttribArray(INSTANCE_COLOR_LOCATION)
+        glVertexAttribDivisor(INSTANCE_COLOR_LOCATION, 1)
+
+        glBindVertexArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def draw(self, count, first):
+        """
+        绘制实例缓冲中从 first 开始的 count 个实例，调用前需已绑定 self.vao
+        """
+        glDrawElementsInstancedBaseInstance(GL_TRIANGLES, self.count, GL_UNSIGNED_INT, None, count, first)
+
+    def release(self):
+        glDeleteBuffers(2, [self.vbo, self.ebo])
+        glDeleteVertexArrays(1, [self.vao])
+
+
+def create_texture(img_data):
+    """
+    上传纹理图片并生成 mipmap
+    """
+    texture = glGenTextures(1)
+    glBindTexture(GL_TEXTURE_2D, texture)
+    glPixelStorei(GL_UNPACK_ALIGNMENT, 1)  # RGB 每行字节数不一定是 4 的倍数
+    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGB, img_data.shape[1], img_data.shape[0], 0, GL_RGB, GL_UNSIGNED_BYTE, np.ascontiguousarray(img_data))
+    glGenerateMipmap(GL_TEXTURE_2D)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
+    glTexParameteri(
+        GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
+    glTexParameteri(
+        GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+    glBindTexture(GL_TEXTURE_2D, 0)
+    return texture
+
+
 class PreviewWidget(QOpenGLWidget):
     """
     负责渲染场景的 OpenGL Widget
     """
+    ray_traced_changed = Signal(bool)
+
     def __init__(self, parent=None, light_pos=glm.vec3(-1.0, 3.0, -2.0), eye=glm.vec3(0, 5, 10), center=glm.vec3(0, 0, 0), up=glm.vec3(0, 1, 0), fov=60.0, near=0.1, far=100.0):
         super().__init__(parent)
         self.shader_program = None
         self.object_list = []
+        self.meshes = {}  # mesh_key -> MeshBuffers
+        self.textures = {}  # id(纹理数组) -> (纹理对象, 纹理数组)
+        self.resources_dirty = False
         self.light_pos = light_pos  # 默认光源位置
         self.fixed_light_pos = light_pos  # 固定光源位置
 
@@ -24,21 +155,56 @@ class PreviewWidget(QOpenGLWidget):
         self.original_center = self.last_center = self.center = center
         self.view = glm.lookAt(eye, center, up)  # 默认视图矩阵
         self.fov = fov
+        self.near = near
+        self.far = far
         self.proj_func = lambda width, height: glm.perspective(glm.radians(60.0), width/height, near, far)  # 投影矩阵函数
 
         self.is_rotating = False  # 默认不旋转
         self.auto_rotation_angle = 0.0  # 初始旋转角度
-        self.auto_rotation_speed = 0.6  # 旋转速度
+        self.auto_rotation_speed = 60.0  # 旋转速度（度/秒），按实际经过的时间推进
+        self.last_rotation_time = None
 
-        # 设置定时器用于更新旋转
+        # 帧节奏：'vsync' 时每帧交换到屏幕后立即请求下一帧，由垂直同步限速；
+        # 'timer' 时由固定间隔的定时器驱动。驱动或系统关闭了垂直同步时 'vsync' 也改用定时器
+        self.pacing = 'vsync'
         self.rotation_timer = QTimer(self)
         self.rotation_timer.timeout.connect(self.update_auto_rotation)
+        self.frameSwapped.connect(self.on_frame_swapped)
+
+        # 帧时间统计，show_stats 为 True 时以文字叠加在画面左上角（F3 切换）
+        self.frame_stats = FrameStats()
+        self.show_stats = False
+        self.setFocusPolicy(Qt.StrongFocus)
+
+        # 光线追踪视图（F4 切换）：相机或物体变化时以降低的内部分辨率追踪，分辨率按每帧耗时向 trace_frame_budget 调整；
+        # 停止交互 trace_idle_delay 毫秒后以完整分辨率渐进细化。使用独立的常驻渲染进程池，加速结构在各帧之间 refit 复用
+        self.ray_traced = False
+        self.trace_pool = None
+        self.trace_job = None
+        self.trace_frame_budget = 0.1  # 交互时每帧的目标耗时（秒）
+        self.trace_scale = 0.25  # 交互时内部分辨率与窗口分辨率之比
+        self.trace_scale_range = (0.05, 0.5)
+        self.trace_spl = 2  # 细化时每方向子采样数
+        self.trace_state = None  # 最近一次提交追踪时的相机与光源
+        self.trace_scene_dirty = False  # 物体发生了变化
+        self.trace_pending = False  # 交互帧进行中又发生了变化，完成后立即追踪最新状态
+        self.trace_refining = False
+        self.trace_started = None
+        self.trace_size = None  # 当前追踪的内部分辨率 (宽, 高)
+        self.trace_result = None  # 最近一次追踪结果（0~1 浮点图像），细化时作为初始图像
+        self.trace_upload = None  # 等待上传到纹理的结果（uint8）
+        self.trace_has_image = False
+        self.trace_idle_delay = 150
+        self.refine_timer = QTimer(self)
+        self.refine_timer.setSingleShot(True)
+        self.refine_timer.timeout.connect(lambda: self.start_trace(interactive=False))
 
         self.is_dragging = False  # 鼠标拖拽状态
         self.last_mouse_pos = QPoint()  # 上一次鼠标位置
         self.rotation_speed = 0.3  # 旋转灵敏度
         self.translation_speed = 0.045  # 平移灵敏度
         self.scale_factor = 1.1  # 缩放灵敏度
+        self.pending_mouse = None  # 尚未处理的最新鼠标位置与按键，每帧最多处理一次
 
     def initializeGL(self):
         """
@@ -50,14 +216,37 @@ class PreviewWidget(QOpenGLWidget):
         # 编译着色器
         self.shader_program = self.compile_shaders()
 
-    def calculate_mvp(self, transform):
-        """
-        计算模型-视图-投影矩阵
+        # 每帧数据的统一缓冲（std140 布局，与着色器中的 Frame 块一致）
+        self.frame_data = np.zeros(FRAME_BLOCK_FLOATS, dtype=np.float32)
+        self.frame_ubo = glGenBuffers(1)
+        glBindBuffer(GL_UNIFORM_BUFFER, self.frame_ubo)
+        glBufferData(GL_UNIFORM_BUFFER, self.frame_data.nbytes, None, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+        glBindBufferBase(GL_UNIFORM_BUFFER, FRAME_BLOCK_BINDING, self.frame_ubo)
+
+        # 每帧各物体的实例数据，容量不足时扩大
+        self.instance_data = np.zeros((0, INSTANCE_FLOATS), dtype=np.float32)
+        self.instance_vbo = glGenBuffers(1)
+        self.instance_capacity = 0
+
+        # 光线追踪视图的结果以全屏三角形绘制
+        self.blit_program = self.compile_blit_shaders()
+        self.blit_vao = glGenVertexArrays(1)
+        self.trace_texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, self.trace_texture)
+        for parameter, value in ((GL_TEXTURE_MIN_FILTER, GL_LINEAR), (GL_TEXTURE_MAG_FILTER, GL_LINEAR),
+                                 (GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE), (GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)):
+            glTexParameteri(GL_TEXTURE_2D, parameter, value)
+        glBindTexture(GL_TEXTURE_2D, 0)
+        if self.context() is not None:
+            self.context().aboutToBeDestroyed.connect(self.release_resources)
+
+    def calculate_view_projection(self):
+        """
+        计算视图-投影矩阵，每帧一次
         """
         proj = self.proj_func(self.width, self.height)
-        view = self.view
-        mvp = proj * view * transform
-        return mvp
+        return proj * self.view
 
     def resizeGL(self, width, height):
         """
@@ -66,129 +255,222 @@ class PreviewWidget(QOpenGLWidget):
         glViewport(0, 0, width, height)
         self.width = width
         self.height = height
+        screen = self.screen()
+        if screen is not None and screen.refreshRate() > 0:
+            self.frame_stats.refresh_rate = screen.refreshRate()
         logger.info(f"Resized to {width}x{height}")
 
     def paintGL(self):
         """
         渲染场景
         """
+        self.frame_stats.begin_frame()
+        # 合并上一帧以来的输入与自动旋转，再计算本帧的视图矩阵
+        self.apply_pending_input()
+        if self.is_rotating:
+            self.advance_rotation()
+        self.compute_view()
+        if self.ray_traced:
+            self.check_trace_state()
+
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-        glUseProgram(self.shader_program)
+        if not (self.ray_traced and self.draw_trace_image()):
+            self.draw_objects()
+        self.frame_stats.end_frame()
 
-        # 设置光源位置和颜色
-        light_pos_loc = glGetUniformLocation(self.shader_program, "lightPos")
-        glUniform3f(light_pos_loc, *self.fixed_light_pos)
-        
-        # 设置光照强度
-        glUniform1f(glGetUniformLocation(self.shader_program, "ambientStrength"), 0.35)
-        glUniform1f(glGetUniformLocation(self.shader_program, "diffuseStrength"), 0.9)
-        glUniform1f(glGetUniformLocation(self.shader_program, "specularStrength"), 0.25)
-
-        light_color_loc = glGetUniformLocation(
-            self.shader_program, "lightColor")
-        glUniform3f(light_color_loc, 1.0, 1.0, 1.0)  # 默认白光
-
-        # 设置观察者位置（eye）
-        view_pos_loc = glGetUniformLocation(self.shader_program, "viewPos")
-        glUniform3f(view_pos_loc, *self.eye)
-        
-        # 渲染物体列表
-        texture_unit = 0  # 初始化纹理单元计数
-        for obj in self.object_list:
-            vertices = obj.vertices
-            normals = obj.normals
-            indices = obj.indices
-            texcoords = obj.texcoords
-            transform = obj.transform
-
-            use_texture_loc = glGetUniformLocation(
-                self.shader_program, "useTexture")
-            # 设置纹理或颜色
-            if obj.texture:
-                img_data = obj.get_texture_data()
-
-                # 绑定纹理
-                glActiveTexture(GL_TEXTURE0 + texture_unit)
-                texture = glGenTextures(1)
-                glBindTexture(GL_TEXTURE_2D, texture)
-                glTexImage2D(GL_TEXTURE_2D, 0, GL_RGB, img_data.shape[1], img_data.shape[0], 0, GL_RGB, GL_UNSIGNED_BYTE, img_data)
+        if self.show_stats:
+            self.draw_stats_overlay()
 
-                glUniform1i(use_texture_loc, 1)
+    def draw_objects(self):
+        """
+        光栅化绘制全部物体
+        """
+        program = self.shader_program
+        program.use()
 
-                glGenerateMipmap(GL_TEXTURE_2D)
-                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-                glTexParameteri(
-                    GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
-                glTexParameteri(
-                    GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        # 每帧数据（视图-投影矩阵、光源、观察者位置、光照强度）一次写入统一缓冲
+        frame = self.frame_data
+        frame[0:16] = np.frombuffer(self.calculate_view_projection().to_bytes(), dtype=np.float32)  # 按列存储
+        frame[16:19] = self.fixed_light_pos  # 光源位置
+        frame[20:23] = (1.0, 1.0, 1.0)  # 光源颜色，默认白光
+        frame[24:27] = self.eye  # 观察者位置（eye）
+        glBindBuffer(GL_UNIFORM_BUFFER, self.frame_ubo)
+        glBufferSubData(GL_UNIFORM_BUFFER, 0, frame.nbytes, frame)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+
+        # 渲染物体列表，网格与纹理使用常驻显存的缓冲，只在首次出现时上传
+        if self.resources_dirty:
+            self.release_unused_resources()
+
+        # 按 (网格, 纹理) 分组，每组以一次实例化绘制完成，变换与颜色作为实例属性
+        groups = {}
+        for obj in self.object_list:
+            texture = self.texture_for(obj) if obj.texture else 0
+            groups.setdefault((self.mesh_for(obj), texture), []).append(obj)
+        self.upload_instances(groups)
+
+        use_texture_loc = program.location("useTexture")
+        glActiveTexture(GL_TEXTURE0)
+        glUniform1i(program.location("texture1"), 0)
+        first = 0
+        for (mesh, texture), objects in groups.items():
+            if texture:
                 glBindTexture(GL_TEXTURE_2D, texture)
-                tex_loc = glGetUniformLocation(self.shader_program, "texture1")
-                glUniform1i(tex_loc, texture_unit)
-                texture_unit += 1  # 分配下一个纹理单元
-            else:
-                glUniform1i(use_texture_loc, 0)
-                color_loc = glGetUniformLocation(
-                    self.shader_program, "objectColor")
-                color = obj.color  # 默认白色
-                glUniform3f(color_loc, *color)
-
-            # 动态创建 VAO 和 VBO
-            VAO = glGenVertexArrays(1)
-            glBindVertexArray(VAO)
-
-            # 创建 VBO 并上传顶点和纹理数据
-            VBO = glGenBuffers(1)
-            glBindBuffer(GL_ARRAY_BUFFER, VBO)
-            data = np.hstack((vertices, normals, texcoords)).astype(np.float32)
-            glBufferData(GL_ARRAY_BUFFER, data.nbytes, data, GL_STATIC_DRAW)
-
-            # 配置顶点属性
-            glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE,
-                                  8 * 4, ctypes.c_void_p(0))
-            glEnableVertexAttribArray(0)
-
-            glVertexAttribPointer(1, 3, GL_FLOAT, GL_FALSE,
-                                  8 * 4, ctypes.c_void_p(12))
-            glEnableVertexAttribArray(1)
-
-            glVertexAttribPointer(2, 2, GL_FLOAT, GL_FALSE,
-                                  8 * 4, ctypes.c_void_p(24))
-            glEnableVertexAttribArray(2)
-
-            # 创建 EBO 并上传索引数据
-            EBO = glGenBuffers(1)
-            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, EBO)
-            glBufferData(GL_ELEMENT_ARRAY_BUFFER,
-                         indices.nbytes, indices, GL_STATIC_DRAW)
-
-            # 设置着色器中的 uniform
-            mvp_loc = glGetUniformLocation(self.shader_program, "MVP")
-            model_loc = glGetUniformLocation(self.shader_program, "model")
-
-            mvp = self.calculate_mvp(transform)
-            glUniformMatrix4fv(mvp_loc, 1, GL_FALSE, glm.value_ptr(mvp))
-            glUniformMatrix4fv(model_loc, 1, GL_FALSE,
-                               glm.value_ptr(transform))
-
-            # 绘制
-            glDrawElements(GL_TRIANGLES, 3 * len(indices), GL_UNSIGNED_INT, None)
-
-            # 清理 VAO 和 VBO
-            glBindBuffer(GL_ARRAY_BUFFER, 0)
-            glBindVertexArray(0)
-            glDeleteBuffers(1, [VBO, EBO])
-            glDeleteVertexArrays(1, [VAO])
+            glUniform1i(use_texture_loc, 1 if texture else 0)
+            glBindVertexArray(mesh.vao)
+            mesh.draw(len(objects), first)
+            first += len(objects)
+
+        glBindVertexArray(0)
+        glBindTexture(GL_TEXTURE_2D, 0)
+        glUseProgram(0)
 
+    def draw_trace_image(self):
+        """
+        绘制光线追踪视图的最新结果，按窗口大小线性插值放大
+        :return: 是否已有结果可以绘制
+        """
+        if self.trace_upload is not None:
+            height, width, _ = self.trace_upload.shape
+            glBindTexture(GL_TEXTURE_2D, self.trace_texture)
+            glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGB8, width, height, 0, GL_RGB, GL_UNSIGNED_BYTE, self.trace_upload)
+            self.trace_upload = None
+            self.trace_has_image = True
+        if not self.trace_has_image:
+            return False
+        glDisable(GL_DEPTH_TEST)
+        self.blit_program.use()
+        glActiveTexture(GL_TEXTURE0)
+        glBindTexture(GL_TEXTURE_2D, self.trace_texture)
+        glUniform1i(self.blit_program.location("image"), 0)
+        glBindVertexArray(self.blit_vao)
+        glDrawArrays(GL_TRIANGLES, 0, 3)
+        glBindVertexArray(0)
+        glBindTexture(GL_TEXTURE_2D, 0)
         glUseProgram(0)
+        glEnable(GL_DEPTH_TEST)
+        return True
+
+    def draw_stats_overlay(self):
+        """
+        在画面上叠加帧时间统计
+        """
+        painter = QPainter(self)
+        painter.setPen(QColor(255, 255, 255))
+        text = self.frame_stats.text()
+        if self.ray_traced and self.trace_size is not None:
+            text += f" | ray traced {self.trace_size[0]}x{self.trace_size[1]}{' (refining)' if self.trace_refining else ''}"
+        painter.drawText(8, 16, text)
+        painter.end()
+        # QPainter 会改动 OpenGL 状态，恢复下一帧需要的设置
+        glEnable(GL_DEPTH_TEST)
+        glClearColor(0.1, 0.1, 0.1, 1.0)
+
+    def on_frame_swapped(self):
+        """
+        一帧已交换到屏幕。连续动画时立即请求下一帧，帧率由垂直同步决定，不会比屏幕刷新更快
+        """
+        self.frame_stats.frame_presented(animating=self.is_rotating)
+        if self.is_rotating and self.vsync_paced():
+            self.update()
+
+    def vsync_paced(self):
+        """
+        是否由垂直同步驱动动画。交换间隔为 0 时交换不会等待屏幕刷新，逐帧请求会让 CPU/GPU 满负荷空转
+        """
+        return self.pacing == 'vsync' and self.format().swapInterval() > 0
+
+    def upload_instances(self, groups):
+        """
+        按分组顺序把各物体的模型矩阵与颜色写入实例缓冲
+        """
+        count = sum(len(objects) for objects in groups.values())
+        if len(self.instance_data) < count:
+            self.instance_data = np.zeros((max(count, 2 * len(self.instance_data)), INSTANCE_FLOATS), dtype=np.float32)
+        data = self.instance_data
+        row = 0
+        for objects in groups.values():
+            for obj in objects:
+                data[row, 0:16] = np.frombuffer(obj.transform.to_bytes(), dtype=np.float32)
+                data[row, 16:19] = obj.color
+                row += 1
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.instance_vbo)
+        if data.nbytes > self.instance_capacity:
+            glBufferData(GL_ARRAY_BUFFER, data.nbytes, None, GL_DYNAMIC_DRAW)
+            self.instance_capacity = data.nbytes
+        if count:
+            glBufferSubData(GL_ARRAY_BUFFER, 0, count * INSTANCE_FLOATS * 4, data[:count])
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
 
     def update_objects(self, objects):
         """
         更新物体列表并重新渲染
         """
         self.object_list = objects
+        self.resources_dirty = True  # 下一帧释放不再使用的网格与纹理
+        self.trace_scene_dirty = True
         self.update_view()  # 触发重新渲染
 
+    def object_changed(self, obj, properties):
+        """
+        单个物体的属性发生变化。变换与颜色每帧写入实例缓冲，只需重绘；几何或纹理变化时下一帧再整理显存资源
+        :param properties: 发生变化的属性名集合
+        """
+        if properties & {'vertices', 'normals', 'indices', 'texcoords', 'texture'}:
+            self.resources_dirty = True
+        self.trace_scene_dirty = True
+        self.update()
+
+    def mesh_for(self, obj):
+        """
+        返回物体网格的显存缓冲，几何数组未变化时复用，多个物体共享同一组数组（如同参数生成的几何体）时共用，
+        并在绘制时合并为一次实例化绘制
+        """
+        key = mesh_key(obj)
+        mesh = self.meshes.get(key)
+        if mesh is None:
+            mesh = self.meshes[key] = MeshBuffers(obj.vertices, obj.normals, obj.indices, obj.texcoords, self.instance_vbo)
+        return mesh
+
+    def texture_for(self, obj):
+        """
+        返回物体纹理的 OpenGL 纹理对象，使用同一图片的物体共用（见 model/texture_cache.py）
+        """
+        data = obj.get_texture_data()
+        entry = self.textures.get(id(data))
+        if entry is None:
+            entry = self.textures[id(data)] = (create_texture(data), data)  # 同时保持数组存活，避免 id 被复用
+        return entry[0]
+
+    def release_unused_resources(self):
+        """
+        释放场景中已没有物体使用的网格缓冲与纹理，需在 OpenGL 上下文中调用
+        """
+        used_meshes = {mesh_key(obj) for obj in self.object_list}
+        for key in [key for key in self.meshes if key not in used_meshes]:
+            self.meshes.pop(key).release()
+        used_textures = {id(obj.texture_data) for obj in self.object_list if obj.texture}
+        unused = [key for key in self.textures if key not in used_textures]
+        if unused:
+            glDeleteTextures(len(unused), [self.textures.pop(key)[0] for key in unused])
+        self.resources_dirty = False
+
+    def release_resources(self):
+        """
+        释放全部显存资源（OpenGL 上下文销毁前）
+        """
+        self.makeCurrent()
+        object_list, self.object_list = self.object_list, []
+        self.release_unused_resources()
+        self.object_list = object_list
+        glDeleteBuffers(2, [self.frame_ubo, self.instance_vbo])
+        glDeleteVertexArrays(1, [self.blit_vao])
+        glDeleteTextures([self.trace_texture])
+        self.trace_has_image = False
+        self.doneCurrent()
+
     def compile_shaders(self):
         """
         编译顶点和片段着色器
@@ -198,19 +480,28 @@ class PreviewWidget(QOpenGLWidget):
         layout(location = 0) in vec3 position;
         layout(location = 1) in vec3 normal;
         layout(location = 2) in vec2 texcoord;
+        layout(location = 3) in mat4 model;         // 实例属性：模型矩阵
+        layout(location = 7) in vec3 color;         // 实例属性：对象颜色
 
-        uniform mat4 MVP;
-        uniform mat4 model;
+        layout(std140, binding = 0) uniform Frame {
+            mat4 viewProjection;
+            vec3 lightPos;
+            vec3 lightColor;
+            vec3 viewPos;
+        };
 
         out vec3 FragPos;     // 片段的世界坐标
         out vec3 Normal;      // 片段的法线
         out vec2 TexCoord;    // 片段的纹理坐标
+        flat out vec3 ObjectColor;
 
         void main() {
-            gl_Position = MVP * vec4(position, 1.0);
-            FragPos = vec3(model * vec4(position, 1.0));
+            vec4 worldPos = model * vec4(position, 1.0);
+            gl_Position = viewProjection * worldPos;
+            FragPos = vec3(worldPos);
             Normal = mat3(transpose(inverse(model))) * normal; // 转换法线到世界坐标
             TexCoord = texcoord;  // 传递纹理坐标
+            ObjectColor = color;
         }
 
         """
@@ -220,16 +511,20 @@ class PreviewWidget(QOpenGLWidget):
         in vec3 FragPos;
         in vec3 Normal;
         in vec2 TexCoord;
-
-        uniform vec3 lightPos;        // 光源位置
-        uniform vec3 lightColor;      // 光源颜色
-        uniform vec3 objectColor;     // 对象颜色
+        flat in vec3 ObjectColor;     // 对象颜色
+
+        layout(std140, binding = 0) uniform Frame {
+            mat4 viewProjection;
+            vec3 lightPos;            // 光源位置
+            vec3 lightColor;          // 光源颜色
+            vec3 viewPos;             // 观察者位置
+        };
         uniform sampler2D texture1;   // 主纹理
         uniform bool useTexture;      // 是否使用纹理
-        uniform vec3 viewPos;         // 观察者位置
-        uniform float ambientStrength;  // 环境光强度
-        uniform float diffuseStrength;  // 漫反射强度
-        uniform float specularStrength; // 镜面反射强度
+
+        const float ambientStrength = 0.35;  // 环境光强度
+        const float diffuseStrength = 0.9;   // 漫反射强度
+        const float specularStrength = 0.25; // 镜面反射强度
 
         out vec4 FragColor;
 
@@ -261,25 +556,53 @@ class PreviewWidget(QOpenGLWidget):
 
             // 选择纹理或颜色
             vec4 texColor = texture(texture1, TexCoord);
-            vec3 finalColor = useTexture ? texColor.rgb : objectColor;
+            vec3 finalColor = useTexture ? texColor.rgb : ObjectColor;
 
             FragColor = vec4(finalColor * lighting, 1.0);
         }
         """
 
-        # 编译着色器
-        vs = shaders.compileShader(vertex_shader, GL_VERTEX_SHADER)
-        fs = shaders.compileShader(fragment_shader, GL_FRAGMENT_SHADER)
-        program = shaders.compileProgram(vs, fs)
+        return ShaderProgram(vertex_shader, fragment_shader)
+
+    def compile_blit_shaders(self):
+        """
+        编译绘制光线追踪结果的着色器：由 gl_VertexID 生成覆盖整个视口的三角形，不需要顶点缓冲
+        """
+        vertex_shader = """
+        #version 430 core
+        out vec2 TexCoord;
+
+        void main() {
+            vec2 corner = vec2((gl_VertexID << 1) & 2, gl_VertexID & 2);
+            TexCoord = vec2(corner.x, 1.0 - corner.y);  // 图像第一行在顶部
+            gl_Position = vec4(corner * 2.0 - 1.0, 0.0, 1.0);
+        }
+        """
+
+        fragment_shader = """
+        #version 430 core
+        in vec2 TexCoord;
+        uniform sampler2D image;
+
+        out vec4 FragColor;
+
+        void main() {
+            FragColor = vec4(texture(image, TexCoord).rgb, 1.0);
+        }
+        """
 
-        return program
+        return ShaderProgram(vertex_shader, fragment_shader)
 
     def start_rotation(self):
         """
         启动旋转
         """
         self.is_rotating = True
-        self.rotation_timer.start(10)  # 每10ms更新一次，约100帧每秒
+        self.last_rotation_time = time.perf_counter()
+        if not self.vsync_paced():
+            self.rotation_timer.start(10)  # 每10ms请求一帧，约100帧每秒
+        else:
+            self.update()  # 之后每帧交换完成时请求下一帧
 
     def stop_rotation(self):
         """
@@ -302,23 +625,143 @@ class PreviewWidget(QOpenGLWidget):
 
         self.update_view()
 
-    def update_view(self):
+    def compute_view(self):
         # 水平旋转视角
         horizontal_auto_rotation = glm.rotate(glm.mat4(1.0), glm.radians(self.auto_rotation_angle), glm.vec3(0.0, 1.0, 0.0))
         self.auto_eye = self.center + glm.vec3(horizontal_auto_rotation * glm.vec4(self.eye - self.center, 1.0))
 
         self.view = glm.lookAt(self.auto_eye, self.center, glm.vec3(0, 1, 0))
-        self.update()  # 强制刷新重绘
+
+    def update_view(self):
+        self.compute_view()
+        self.update()  # 请求重绘，同一轮事件循环中的多次请求只绘制一次
+
+    def advance_rotation(self):
+        """
+        按距上一帧实际经过的时间推进旋转角度，帧率变化时旋转速度保持不变
+        """
+        now = time.perf_counter()
+        if self.last_rotation_time is not None:
+            self.auto_rotation_angle = (self.auto_rotation_angle + self.auto_rotation_speed * (now - self.last_rotation_time)) % 360.0
+        self.last_rotation_time = now
 
     def update_auto_rotation(self):
         """
-        更新旋转角度
+        定时器驱动（pacing 为 'timer' 或没有垂直同步）时请求下一帧，旋转角度在绘制时推进
         """
-        if self.is_rotating:
-            self.auto_rotation_angle += self.auto_rotation_speed
-        if self.auto_rotation_angle >= 360.0:
-            self.auto_rotation_angle -= 360.0 
-        self.update_view()
+        self.update()
+
+    def set_stats_overlay(self, visible):
+        self.show_stats = visible
+        self.frame_stats.reset()
+        self.update()
+
+    def set_ray_traced(self, enabled):
+        """
+        切换光线追踪视图，首次开启时启动视图专用的渲染进程池
+        """
+        if enabled == self.ray_traced:
+            return
+        self.ray_traced = enabled
+        if enabled:
+            if self.trace_job is None:
+                self.trace_pool = RenderPool()
+                self.trace_job = RenderJob(self.trace_pool)
+                self.trace_job.progress_update.connect(self.on_trace_progress)
+                self.trace_job.finished.connect(self.on_trace_finished)
+            self.trace_state = None  # 下一帧按当前状态追踪
+        else:
+            self.refine_timer.stop()
+            self.trace_job.cancel()
+            self.trace_has_image = False
+            self.trace_upload = self.trace_result = None
+        self.ray_traced_changed.emit(enabled)
+        self.update()
+
+    def close_ray_tracing(self):
+        """
+        取消光线追踪视图的渲染并关闭其进程池（应用退出前）
+        """
+        if self.trace_job is not None:
+            self.refine_timer.stop()
+            self.trace_job.cancel()
+            self.trace_job.wait()
+            self.trace_pool.close()
+            self.trace_job = self.trace_pool = None
+        self.ray_traced = False
+
+    def check_trace_state(self):
+        """
+        每帧检查相机、光源、窗口大小与物体是否变化，有变化时请求新的交互帧
+        """
+        state = (tuple(self.auto_eye), tuple(self.center), tuple(self.fixed_light_pos), self.width, self.height)
+        if state == self.trace_state and not self.trace_scene_dirty:
+            return
+        self.trace_state = state
+        self.trace_scene_dirty = False
+        self.refine_timer.stop()
+        if self.trace_job.active and not self.trace_refining:
+            self.trace_pending = True  # 不打断进行中的交互帧，否则持续交互时一帧也完成不了
+        else:
+            self.start_trace(interactive=True)
+
+    def start_trace(self, interactive):
+        """
+        提交一帧光线追踪：交互帧以 trace_scale 缩小分辨率、每像素一条光线；
+        细化帧为完整分辨率的渐进渲染，以上一帧结果放大后作为初始图像
+        """
+        self.trace_pending = False
+        self.trace_refining = not interactive
+        ratio = self.devicePixelRatio()
+        scale = self.trace_scale if interactive else 1.0
+        width = max(8, round(self.width * ratio * scale))
+        height = max(8, round(self.height * ratio * scale))
+        image = None
+        if not interactive and self.trace_result is not None:
+            rows = np.arange(height) * self.trace_result.shape[0] // height
+            cols = np.arange(width) * self.trace_result.shape[1] // width
+            image = self.trace_result[rows][:, cols]
+        properties = {'eye': glm.vec3(self.auto_eye), 'center': glm.vec3(self.center), 'up': glm.vec3(0, 1, 0),
+                      'fov': self.fov, 'near': self.near, 'far': self.far}
+        self.trace_size = (width, height)
+        self.trace_started = time.perf_counter()
+        self.trace_job.restart(objects=list(self.object_list), properties=properties, width=width, height=height,
+                               light_pos=glm.vec3(self.fixed_light_pos), image=image, output=None, preview=False,
+                               spl=1 if interactive else self.trace_spl, progressive=not interactive,
+                               tile_order='center' if interactive else 'cost')
+
+    def on_trace_progress(self, progress, image):
+        # 交互帧未完成的块是黑色，只显示细化过程中的结果
+        if self.ray_traced and self.trace_refining:
+            self.show_trace_image(image)
+
+    def on_trace_finished(self, ray_tracer):
+        if not self.ray_traced:  # 关闭视图前已完成、尚在事件队列中的结果
+            return
+        self.show_trace_image(ray_tracer.image)
+        if self.trace_refining:
+            return
+        # 按本帧耗时调整下一帧的分辨率，像素数与耗时近似成正比
+        elapsed = time.perf_counter() - self.trace_started
+        low, high = self.trace_scale_range
+        self.trace_scale = min(high, max(low, self.trace_scale * min(2.0, (self.trace_frame_budget / elapsed) ** 0.5)))
+        if self.trace_pending:
+            self.start_trace(interactive=True)
+        else:
+            self.refine_timer.start(self.trace_idle_delay)
+
+    def show_trace_image(self, image):
+        self.trace_result = image
+        self.trace_upload = (np.clip(image, 0, 1) * 255).astype(np.uint8)
+        self.update()
+
+    def keyPressEvent(self, event):
+        if event.key() == Qt.Key_F3:
+            self.set_stats_overlay(not self.show_stats)
+        elif event.key() == Qt.Key_F4:
+            self.set_ray_traced(not self.ray_traced)
+        else:
+            super().keyPressEvent(event)
 
     def mousePressEvent(self, event: QMouseEvent):
         """
@@ -333,19 +776,28 @@ class PreviewWidget(QOpenGLWidget):
 
     def mouseMoveEvent(self, event: QMouseEvent):
         """
-        捕获鼠标移动事件，执行旋转或平移。
+        捕获鼠标移动事件。只记录最新位置，旋转或平移在下一帧绘制前执行一次，
+        两帧之间的多次移动合并处理
         """
-        logger.debug(f"Mouse moved to {event.pos()}")
         if not self.is_dragging:
             return
+        self.pending_mouse = (event.pos(), event.buttons())
+        self.update()
 
-        current_mouse_pos = event.pos()
+    def apply_pending_input(self):
+        """
+        按最新的鼠标位置执行旋转或平移。拖拽的效果只取决于相对按下时的总位移，因此只需处理最后一次移动
+        """
+        if self.pending_mouse is None:
+            return
+        current_mouse_pos, buttons = self.pending_mouse
+        self.pending_mouse = None
         delta = current_mouse_pos - self.last_mouse_pos  # 鼠标移动增量
 
-        if event.buttons() & Qt.LeftButton:  # 左键拖动，旋转
+        if buttons & Qt.LeftButton:  # 左键拖动，旋转
             self.rotate_view(delta)
 
-        elif event.buttons() & Qt.RightButton:  # 右键拖动，平移
+        elif buttons & Qt.RightButton:  # 右键拖动，平移
             self.translate_view(delta)
 
     def mouseReleaseEvent(self, event: QMouseEvent):
@@ -401,8 +853,6 @@ class PreviewWidget(QOpenGLWidget):
         # 更新 eye 位置
         self.eye = self.center + direction
 
-        self.update_view()
-
     def translate_view(self, delta):
         """
         根据鼠标增量执行视图平移，平移 eye 和 center 在它们连线的垂直平面内。
@@ -429,8 +879,6 @@ class PreviewWidget(QOpenGLWidget):
         self.eye = self.eye + vertical_translation
         self.center = self.center +  vertical_translation
 
-        self.update_view()
-
 # __name__ = "__main__"
 def generate_plane(size=5.0):
     vertices = np.array([
@@ -1,10 +1,19 @@
 from PySide6.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QFormLayout, QDoubleSpinBox, QLabel, QDialogButtonBox, QSlider
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QTimer
 from utils.logger import logger
 from model.objects import *
 import glm
 
+TRANSFORM_PROPERTIES = ('translation', 'rotation', 'scale')
+
 class TransformConfigDialog(QDialog):
+	"""
+	物体的平移、旋转、缩放设置对话框。
+	数值变化时调用 callback(obj, properties)，properties 为发生变化的属性名集合；
+	拖动滑动条等快速连续的变化在 update_interval 毫秒内合并为一次回调
+	"""
+	update_interval = 16  # 约一帧
+
 	def __init__(self, obj: Object, callback, parent=None):
 		self.obj = obj
 		name = obj.name
@@ -21,6 +30,13 @@ class TransformConfigDialog(QDialog):
 		super().__init__(parent)
 		self.setWindowTitle(f"Transform - {name}")
 
+		# 待通知的变化，由定时器合并后统一应用
+		self.pending_changes = set()
+		self.change_timer = QTimer(self)
+		self.change_timer.setSingleShot(True)
+		self.change_timer.setInterval(self.update_interval)
+		self.change_timer.timeout.connect(self.flush_changes)
+
 		# 操作和确认布局
 		global_layout = QVBoxLayout()
 
@@ -231,25 +247,18 @@ class TransformConfigDialog(QDialog):
 		self.scale_z.valueChanged.connect(self.sync_scale_z_slider)
 		self.scale_z_slider.valueChanged.connect(self.sync_scale_z_spinbox)
 
-		# 同步信号：每当值变化时，实时更新视图
-		self.translation_x.valueChanged.connect(self.update_view)
-		self.translation_y.valueChanged.connect(self.update_view)
-		self.translation_z.valueChanged.connect(self.update_view)
-		self.translation_x_slider.valueChanged.connect(self.update_view)
-		self.translation_y_slider.valueChanged.connect(self.update_view)
-		self.translation_z_slider.valueChanged.connect(self.update_view)
-		self.rotation_x.valueChanged.connect(self.update_view)
-		self.rotation_y.valueChanged.connect(self.update_view)
-		self.rotation_z.valueChanged.connect(self.update_view)
-		self.rotation_x_slider.valueChanged.connect(self.update_view)
-		self.rotation_y_slider.valueChanged.connect(self.update_view)
-		self.rotation_z_slider.valueChanged.connect(self.update_view)
-		self.scale_x.valueChanged.connect(self.update_view)
-		self.scale_y.valueChanged.connect(self.update_view)
-		self.scale_z.valueChanged.connect(self.update_view)
-		self.scale_x_slider.valueChanged.connect(self.update_view)
-		self.scale_y_slider.valueChanged.connect(self.update_view)
-		self.scale_z_slider.valueChanged.connect(self.update_view)
+		# 同步信号：每当值变化时记录变化的属性，合并后更新视图
+		widgets = {
+			'translation': (self.translation_x, self.translation_y, self.translation_z,
+							self.translation_x_slider, self.translation_y_slider, self.translation_z_slider),
+			'rotation': (self.rotation_x, self.rotation_y, self.rotation_z,
+						 self.rotation_x_slider, self.rotation_y_slider, self.rotation_z_slider),
+			'scale': (self.scale_x, self.scale_y, self.scale_z,
+					  self.scale_x_slider, self.scale_y_slider, self.scale_z_slider),
+		}
+		for prop, prop_widgets in widgets.items():
+			for widget in prop_widgets:
+				widget.valueChanged.connect(lambda _, prop=prop: self.schedule_change(prop))
 
 		# 将三个小布局添加到主布局中
 		main_layout.addLayout(translation_layout)
@@ -360,21 +369,36 @@ class TransformConfigDialog(QDialog):
 		self.scale_z.setValue(self.original_scale[2])
 		self.update_view()
 
-	def update_transform(self):
-		# 获取新的平移、旋转和缩放值
+	def update_transform(self, properties=TRANSFORM_PROPERTIES):
+		# 获取新的平移、旋转和缩放值，只更新发生变化的属性
 		obj=self.obj
 
-		new_translation = glm.vec3(self.translation_x.value(), self.translation_y.value(), self.translation_z.value())
-		new_rotation = glm.vec3(self.rotation_x.value(), self.rotation_y.value(), self.rotation_z.value())
-		new_scale = glm.vec3(self.scale_x.value(), self.scale_y.value(), self.scale_z.value())
-
-		# 更新 obj 中的值
-		obj.translation = new_translation
-		obj.rotation = new_rotation
-		obj.scale = new_scale
+		if 'translation' in properties:
+			obj.translation = glm.vec3(self.translation_x.value(), self.translation_y.value(), self.translation_z.value())
+		if 'rotation' in properties:
+			obj.rotation = glm.vec3(self.rotation_x.value(), self.rotation_y.value(), self.rotation_z.value())
+		if 'scale' in properties:
+			obj.scale = glm.vec3(self.scale_x.value(), self.scale_y.value(), self.scale_z.value())
 		obj.update_transform()
 
+	def schedule_change(self, prop):
+		"""
+		记录变化的属性，定时器到期时一并应用
+		"""
+		self.pending_changes.add(prop)
+		if not self.change_timer.isActive():
+			self.change_timer.start()
+
+	def flush_changes(self):
+		"""
+		立即应用并通知所有待处理的变化
+		"""
+		self.change_timer.stop()
+		changes, self.pending_changes = self.pending_changes, set()
+		if changes:
+			self.update_transform(changes)
+			self.callback(self.obj, changes)
+
 	def update_view(self):
-		self.update_transform()
-		self.callback()
-		pass
+		self.pending_changes.update(TRANSFORM_PROPERTIES)
+		self.flush_changes()
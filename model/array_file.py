@@ -0,0 +1,94 @@
+'''
+Author: Wh_Xcjm
+Date: 2026-10-18 14:45:53
+LastEditor: Wh_Xcjm
+LastEditTime: 2026-10-18 14:45:53
+FilePath: \大作业\model\array_file.py
+Description: 
+
+Copyright (c) 2025 by WhXcjm, All Rights Reserved. 
+Github: https://github.com/WhXcjm
+'''
+import json
+import struct
+import numpy as np
+
+# 数组容器文件（二进制场景 .mrs 与网格缓存共用）：
+#   MAGIC | uint32 格式版本 | uint64 头部长度 | JSON 头部 | 按 ALIGNMENT 对齐的数组数据区
+# 头部中的 arrays 记录每个数组在数据区中的偏移、形状与 dtype，读取时无需任何文本解析
+MAGIC = b'MRSCENE\0'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+PREAMBLE = struct.Struct('<IQ')
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def write_array_file(path, header, arrays):
+    """
+    写入数组容器文件
+    :param header: 可 JSON 序列化的头部，arrays 字段由本函数填写
+    :param arrays: 数组列表，头部中按下标引用
+    :return: 数据区字节数
+    """
+    arrays = [np.ascontiguousarray(array) for array in arrays]
+    offsets = []
+    data_size = 0
+    for array in arrays:
+        offsets.append(_align(data_size))
+        data_size = offsets[-1] + array.nbytes
+    header = dict(header, arrays=[{'offset': offset, 'shape': list(array.shape), 'dtype': array.dtype.str}
+                                  for array, offset in zip(arrays, offsets)])
+    header = json.dumps(header, ensure_ascii=False).encode('utf-8')
+
+    data_start = _align(len(MAGIC) + PREAMBLE.size + len(header))
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(PREAMBLE.pack(FORMAT_VERSION, len(header)))
+        f.write(header)
+        for array, offset in zip(arrays, offsets):
+            f.write(b'\0' * (data_start + offset - f.tell()))
+            f.write(array.tobytes())
+    return data_size
+
+
+def read_array_header(data):
+    """
+    解析数组容器文件的头部
+    :param data: 文件内容（bytes 或支持缓冲区协议的对象）
+    :return: (header, data_start)
+    """
+    if bytes(data[:len(MAGIC)]) != MAGIC:
+        raise ValueError("Not a MiniRayRender scene file")
+    version, header_size = PREAMBLE.unpack_from(data, len(MAGIC))
+    if version > FORMAT_VERSION:
+        raise ValueError(f"Unsupported scene file version: {version}")
+    header_start = len(MAGIC) + PREAMBLE.size
+    header = json.loads(bytes(data[header_start:header_start + header_size]).decode('utf-8'))
+    return header, _align(header_start + header_size)
+
+
+def array_views(buffer, header, data_start):
+    """
+    按头部描述在 buffer 上构造各数组的视图，不发生拷贝
+    """
+    arrays = []
+    for info in header['arrays']:
+        dtype = np.dtype(info['dtype'])
+        start = data_start + info['offset']
+        count = int(np.prod(info['shape']))
+        arrays.append(buffer[start:start + count * dtype.itemsize].view(dtype).reshape(info['shape']))
+    return arrays
+
+
+def map_array_file(path):
+    """
+    以只读 np.memmap 映射数组容器文件。各数组均为同一映射上的视图，
+    多个进程映射同一文件时共享操作系统的页缓存，不占用额外的私有内存
+    :return: (header, arrays)
+    """
+    buffer = np.memmap(path, dtype=np.uint8, mode='r')
+    header, data_start = read_array_header(buffer)
+    return header, array_views(buffer, header, data_start)
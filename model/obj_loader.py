@@ -0,0 +1,281 @@
+'''
+Author: Wh_Xcjm
+Date: 2026-10-18 14:43:47
+LastEditor: Wh_Xcjm
+LastEditTime: 2026-10-18 14:45:53
+FilePath: \大作业\model\obj_loader.py
+Description: 
+
+Copyright (c) 2025 by WhXcjm, All Rights Reserved. 
+Github: https://github.com/WhXcjm
+'''
+import hashlib
+import os
+import numpy as np
+from model.array_file import write_array_file, map_array_file
+from utils.logger import logger
+
+# 按字节查表判断空白字符
+IS_SPACE = np.zeros(256, dtype=bool)
+IS_SPACE[[ord(' '), ord('\t'), ord('\r'), ord('\n')]] = True
+
+
+class _Chunk():
+    """
+    一段由完整行组成的 OBJ 文本，去掉 # 注释后按行首关键字分类，并统计每行以空白分隔的字段数
+    """
+    def __init__(self, data):
+        if len(data) == 0 or data[-1] != ord('\n'):
+            data = np.append(data, np.uint8(ord('\n')))
+        data = self.data = data.copy()
+        ends = np.flatnonzero(data == ord('\n'))
+        self.starts = np.concatenate(([0], ends[:-1] + 1))
+        self.lengths = ends - self.starts + 1
+        self.line_of_byte = np.repeat(np.arange(len(self.starts)), self.lengths)
+        # 每行第一个 # 及其后的内容（行尾换行符除外）替换为空白
+        is_hash = data == ord('#')
+        if is_hash.any():
+            hashes = np.cumsum(is_hash)
+            hashes_before_line = hashes[self.starts] - is_hash[self.starts]
+            comment = (hashes > hashes_before_line[self.line_of_byte]) & (data != ord('\n'))
+            data[comment] = ord(' ')
+        padded = np.append(data, np.zeros(2, dtype=np.uint8))
+        first, second, third = padded[self.starts], padded[self.starts + 1], padded[self.starts + 2]
+        space = IS_SPACE[second]
+        self.kinds = {
+            'v': (first == ord('v')) & space,
+            'vt': (first == ord('v')) & (second == ord('t')) & IS_SPACE[third],
+            'vn': (first == ord('v')) & (second == ord('n')) & IS_SPACE[third],
+            'f': (first == ord('f')) & space,
+        }
+        # 抹去行首关键字，之后各行只剩数值字段
+        for kind, mask in self.kinds.items():
+            for k in range(len(kind)):
+                self.data[self.starts[mask] + k] = ord(' ')
+        # 每行的字段数：统计空白之后紧跟非空白的位置
+        is_space = IS_SPACE[self.data]
+        token_start = ~is_space & np.concatenate(([True], is_space[:-1]))
+        self.token_counts = np.add.reduceat(token_start.astype(np.int64), self.starts)
+
+    def fields(self, kind):
+        """
+        :return: 该类每一行的字段数
+        """
+        return self.token_counts[self.kinds[kind]]
+
+    def text(self, kind):
+        """
+        :return: 该类行（已去掉关键字）拼接成的文本
+        """
+        return self.data[self.kinds[kind][self.line_of_byte]].tobytes()
+
+    def running_count(self, kind):
+        """
+        :return: 每一行（含）之前该类行的累计个数，用于解析负数（相对）下标
+        """
+        return np.cumsum(self.kinds[kind])
+
+
+def _parse_vectors(chunk, kind, size, min_fields):
+    """
+    解析 v / vt / vn 行，每行取前 size 个分量（忽略可选的 w 分量或顶点颜色），不足的分量补 0
+    """
+    counts = chunk.fields(kind)
+    if len(counts) == 0:
+        return np.zeros((0, size))
+    if counts.min() < min_fields:
+        raise ValueError(f"Malformed '{kind}' line in OBJ file")
+    try:
+        values = np.array(chunk.text(kind).split(), dtype=np.float64)
+    except ValueError:
+        raise ValueError(f"Malformed '{kind}' line in OBJ file") from None
+    offsets = np.cumsum(counts) - counts
+    columns = np.arange(size)
+    vectors = values[offsets[:, None] + np.minimum(columns, counts[:, None] - 1)]
+    vectors[columns >= counts[:, None]] = 0.0
+    return vectors
+
+
+def _parse_faces(chunk, counts_before):
+    """
+    解析 f 行并以扇形三角化 n 边形。每个角可以是 v、v/vt、v//vn 或 v/vt/vn，同一文件（乃至同一行）中可以混用
+    :param counts_before: 本块之前 v / vt / vn 的个数，用于把负数下标换算为绝对下标
+    :return: 三角形各角的 (v, vt, vn) 下标，形状为 (T, 3, 3)，从 0 开始，缺省的 vt / vn 为 -1
+    """
+    corners = chunk.fields('f')
+    if len(corners) == 0:
+        return np.zeros((0, 3, 3), dtype=np.int64)
+    # v//vn 中缺省的 vt 写作 0（OBJ 下标从 1 开始，0 不是合法下标），之后按每个角的 / 个数确定各数值所属的属性
+    text = np.frombuffer(chunk.text('f').replace(b'//', b'/0/'), dtype=np.uint8)
+    is_space = IS_SPACE[text]
+    corner_of_byte = np.cumsum(~is_space & np.concatenate(([True], is_space[:-1]))) - 1
+    slashes = np.bincount(corner_of_byte[text == ord('/')], minlength=corners.sum())
+    try:
+        values = np.array(text.tobytes().replace(b'/', b' ').split(), dtype=np.int64)
+    except ValueError:
+        raise ValueError("Malformed 'f' line in OBJ file") from None
+    if slashes.max() > 2 or len(values) != (slashes + 1).sum():
+        raise ValueError("Malformed 'f' line in OBJ file")
+    fields = np.zeros((len(slashes), 3), dtype=np.int64)
+    value_corner = np.repeat(np.arange(len(slashes)), slashes + 1)
+    fields[value_corner, np.arange(len(values)) - np.repeat(np.cumsum(slashes + 1) - (slashes + 1), slashes + 1)] = values
+
+    # 每个角对应的属性下标，负数下标相对于该面之前已定义的数据
+    face_lines = np.flatnonzero(chunk.kinds['f'])
+    attributes = np.full((len(fields), 3), -1, dtype=np.int64)
+    for k, kind in enumerate(('v', 'vt', 'vn')):
+        index = fields[:, k]
+        defined = np.repeat(counts_before[kind] + chunk.running_count(kind)[face_lines], corners)
+        resolved = np.where(index < 0, index + defined, index - 1)
+        if (resolved[index != 0] < 0).any() or (k == 0 and (index == 0).any()):
+            raise ValueError(f"Face references a missing '{kind}' element")
+        attributes[:, k] = np.where(index != 0, resolved, -1)
+
+    # 扇形三角化：n 边形 (c0, c1, ..., cn-1) -> (c0, ci, ci+1)，i = 1 .. n-2
+    triangles = np.maximum(corners - 2, 0)
+    first_corner = np.cumsum(corners) - corners
+    face = np.repeat(np.arange(len(corners)), triangles)
+    local = np.arange(triangles.sum()) - np.repeat(np.cumsum(triangles) - triangles, triangles) + 1
+    base = first_corner[face]
+    return attributes[np.stack((base, base + local, base + local + 1), axis=1)]
+
+
+def _vertex_normals(vertices, indices):
+    """
+    按面积加权平均相邻三角形的法线，得到顶点法线
+    """
+    v0, v1, v2 = (vertices[indices[:, k]] for k in range(3))
+    face_normals = np.cross(v1 - v0, v2 - v0)
+    normals = np.stack([np.bincount(indices.ravel(), weights=np.repeat(face_normals[:, k], 3), minlength=len(vertices))
+                        for k in range(3)], axis=1)
+    length = np.linalg.norm(normals, axis=1, keepdims=True)
+    return np.divide(normals, length, out=np.zeros_like(normals), where=length > 0)
+
+
+def load_obj_arrays(path, progress=None, chunk_size=1 << 24):
+    """
+    分块读取 Wavefront OBJ 文件，全部解析以 NumPy 批量完成，不为每一行构造 Python 对象。
+    支持 v/vt/vn、# 注释、任意边数的面（扇形三角化）、负数（相对）下标，面的各角可以混用 v、v/vt、v//vn、v/vt/vn；
+    不同 (v, vt, vn) 组合展开为独立顶点，缺少法线时按面积加权计算顶点法线
+    :param progress: 进度回调 progress(fraction)，fraction 为已读取的比例
+    :param chunk_size: 每次读取的字节数
+    :return: (vertices, normals, indices, texcoords)，分别为 float32 (N, 3)、float32 (N, 3)、uint32 (T, 3)、float32 (N, 2)
+    """
+    total = max(os.path.getsize(path), 1)
+    positions, texcoords, normals, triangles = [], [], [], []
+    counts = {'v': 0, 'vt': 0, 'vn': 0}
+    done = 0
+    with open(path, 'rb') as f:
+        rest = b''
+        while True:
+            block = f.read(chunk_size)
+            data = rest + block
+            if block:
+                # 只处理到最后一个完整行，剩余部分并入下一块
+                cut = data.rfind(b'\n') + 1
+                data, rest = data[:cut], data[cut:]
+            if data:
+                chunk = _Chunk(np.frombuffer(data, dtype=np.uint8))
+                triangles.append(_parse_faces(chunk, counts))
+                for kind, size, min_fields, target in (('v', 3, 3, positions), ('vt', 2, 1, texcoords), ('vn', 3, 3, normals)):
+                    target.append(_parse_vectors(chunk, kind, size, min_fields))
+                    counts[kind] += len(target[-1])
+            done += len(block)
+            if progress is not None:
+                progress(done / total)
+            if not block:
+                break
+
+    positions = np.concatenate(positions)
+    texcoords = np.concatenate(texcoords)
+    normals = np.concatenate(normals)
+    triangles = np.concatenate(triangles).reshape(-1, 3)
+    if len(triangles) == 0:
+        raise ValueError(f"No faces in OBJ file: {path}")
+
+    for k, (kind, values) in enumerate((('v', positions), ('vt', texcoords), ('vn', normals))):
+        if triangles[:, k].max() >= len(values):
+            raise ValueError(f"Face references a missing '{kind}' element")
+    has_texcoord, has_normal = (triangles[:, 1:] >= 0).any(axis=0)
+    if has_texcoord or has_normal:
+        # 只有部分角给出 vt / vn 时：缺少纹理坐标的角取 (0, 0)，缺少法线的角取其位置按面积加权的顶点法线
+        if has_texcoord and (triangles[:, 1] < 0).any():
+            triangles[:, 1] = np.where(triangles[:, 1] < 0, len(texcoords), triangles[:, 1])
+            texcoords = np.concatenate((texcoords, np.zeros((1, 2))))
+        if has_normal and (triangles[:, 2] < 0).any():
+            triangles[:, 2] = np.where(triangles[:, 2] < 0, len(normals) + triangles[:, 0], triangles[:, 2])
+            normals = np.concatenate((normals, _vertex_normals(positions, triangles[:, 0].reshape(-1, 3))))
+        # 相同 (v, vt, vn) 组合合并为一个顶点
+        sizes = (len(positions), max(len(texcoords), 1), max(len(normals), 1))
+        if np.prod(sizes, dtype=np.float64) < 2 ** 62:
+            keys = (triangles[:, 0] * sizes[1] + np.maximum(triangles[:, 1], 0)) * sizes[2] + np.maximum(triangles[:, 2], 0)
+            keys, inverse = np.unique(keys, return_inverse=True)
+            unique = np.stack((keys // (sizes[1] * sizes[2]), keys // sizes[2] % sizes[1], keys % sizes[2]), axis=1)
+        else:
+            unique, inverse = np.unique(np.maximum(triangles, 0), axis=0, return_inverse=True)
+        indices = inverse.reshape(-1, 3)
+        vertices = positions[unique[:, 0]]
+        vertex_texcoords = texcoords[unique[:, 1]] if has_texcoord else np.zeros((len(unique), 2))
+        vertex_normals = normals[unique[:, 2]] if has_normal else _vertex_normals(vertices, indices)
+    else:
+        indices = triangles[:, 0].reshape(-1, 3)
+        vertices = positions
+        vertex_texcoords = np.zeros((len(positions), 2))
+        vertex_normals = _vertex_normals(vertices, indices)
+
+    logger.info(f"Loaded OBJ {path}: {len(vertices)} vertices, {len(indices)} triangles")
+    return (vertices.astype(np.float32), vertex_normals.astype(np.float32),
+            indices.astype(np.uint32), vertex_texcoords.astype(np.float32))
+
+
+# 网格缓存：解析结果保存在源文件旁的 <源文件名>.meshcache 中（数组容器文件），
+# 头部记录源文件内容的哈希，内容变化或解析格式升级后自动重建
+CACHE_SUFFIX = '.meshcache'
+CACHE_VERSION = 1
+MESH_FIELDS = ('vertices', 'normals', 'indices', 'texcoords')
+
+
+def file_hash(path):
+    """
+    :return: 文件内容的 SHA-1 十六进制摘要
+    """
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha1').hexdigest()
+
+
+def load_obj_cached(path, progress=None, cache_path=None):
+    """
+    读取 OBJ 网格，优先使用磁盘缓存。返回的数组以只读 np.memmap 映射缓存文件，
+    界面与各渲染进程打开同一网格时共享同一份页缓存，不必重新解析，也不占用各自的私有内存。
+    缓存无法写入（如目录只读）时退化为 load_obj_arrays
+    :param cache_path: 缓存文件路径，默认为源文件路径加 CACHE_SUFFIX
+    :return: 同 load_obj_arrays
+    """
+    if cache_path is None:
+        cache_path = path + CACHE_SUFFIX
+    digest = file_hash(path)
+    if os.path.exists(cache_path):
+        try:
+            header, arrays = map_array_file(cache_path)
+            if header.get('source_hash') == digest and header.get('cache_version') == CACHE_VERSION:
+                logger.info(f"Loaded OBJ {path} from cache {cache_path}")
+                if progress is not None:
+                    progress(1.0)
+                return tuple(arrays[header['mesh'][field]] for field in MESH_FIELDS)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring invalid mesh cache {cache_path}: {e}")
+
+    mesh = load_obj_arrays(path, progress=progress)
+    header = {'source': os.path.basename(path), 'source_hash': digest, 'cache_version': CACHE_VERSION,
+              'mesh': {field: index for index, field in enumerate(MESH_FIELDS)}}
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        write_array_file(temp_path, header, mesh)
+        os.replace(temp_path, cache_path)  # 原子替换，其他进程不会读到写了一半的文件
+    except OSError as e:
+        logger.warning(f"Failed to write mesh cache {cache_path}: {e}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return mesh
+    _, arrays = map_array_file(cache_path)
+    return tuple(arrays[index] for index in range(len(MESH_FIELDS)))
@@ -9,13 +9,56 @@ Description:
 Copyright (c) 2025 by WhXcjm, All Rights Reserved. 
 Github: https://github.com/WhXcjm
 '''
-from PIL import Image
+import threading
 import numpy as np
 import glm, math
+from model.texture_cache import texture_cache
 from utils.logger import logger
 
+# Guards the transform cache: the GUI thread edits objects while render threads read (and lazily rebuild) transforms
+_transform_lock = threading.Lock()
+
+
+class TrackedAttribute():
+    """
+    Attribute of an Object whose change invalidates the cached transform and world-space geometry.
+    Vector attributes are stored as a copy, so assign a new vector instead of mutating it in place.
+    Geometry attributes additionally invalidate the data derived from the object-space mesh.
+    """
+    def __init__(self, vector=False, geometry=False):
+        self.vector = vector
+        self.geometry = geometry
+
+    def __set_name__(self, owner, name):
+        self.name = '_' + name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return obj.__dict__[self.name]
+
+    def __set__(self, obj, value):
+        if self.vector:
+            value = glm.vec3(value)
+        old = obj.__dict__.get(self.name)
+        if old is value or (self.vector and old == value):
+            return  # Nothing actually changed, keep the cache
+        obj.__dict__[self.name] = value
+        obj.invalidate_cache(geometry=self.geometry)
+
 
 class Object():
+    # Shape information
+    vertices = TrackedAttribute(geometry=True)
+    normals = TrackedAttribute(geometry=True)
+    indices = TrackedAttribute(geometry=True)
+    texcoords = TrackedAttribute(geometry=True)
+
+    # Transformation information
+    translation = TrackedAttribute(vector=True)
+    rotation = TrackedAttribute(vector=True)
+    scale = TrackedAttribute(vector=True)
+
     def __init__(self, id=None, name="Object", obj_type="Custom", vertices=[], normals=[], indices=[], texcoords=[],
                  translation=glm.vec3(0.0, 0.0, 0.0), rotation=glm.vec3(0.0, 0.0, 0.0), scale=glm.vec3(1.0, 1.0, 1.0),
                  color=glm.vec3(1.0, 1.0, 1.0), ambient=0.35, diffuse=0.9,
@@ -57,7 +100,6 @@ class Object():
         self.translation = translation
         self.rotation = rotation
         self.scale = scale
-        self.transform = glm.mat4(1.0)
 
         # Material information
         self.color = color
@@ -68,15 +110,100 @@ class Object():
         self.shininess = shininess
         self.texture = texture
         self.texture_data = None
+        self.texture_key = None  # texture_cache key (path, mtime, size) texture_data was decoded from
+
+    def invalidate_cache(self, geometry=False):
+        """
+        Drop the cached transform and everything derived from it (inverse matrices, world-space geometry).
+        With geometry=True the data derived from the object-space mesh is dropped as well.
+        """
+        with _transform_lock:
+            self.__dict__['_cache'] = {}
+            self.__dict__['_transform_version'] = self.__dict__.get('_transform_version', 0) + 1
+            self.__dict__['_transform_dirty'] = True
+        if geometry or '_geometry_cache' not in self.__dict__:
+            self.__dict__['_geometry_cache'] = {}
+
+    def __getstate__(self):
+        # Derived data is cheap to rebuild, do not ship it along with the object
+        state = self.__dict__.copy()
+        state['_cache'] = {}
+        state['_geometry_cache'] = {}
+        return state
+
+    def cached(self, key, build, geometry=False):
+        """
+        Return the cached value of `key`, building it with `build()` if the cache is empty.
+        The cache is dropped whenever the transform or the geometry changes; with geometry=True
+        the value only depends on the object-space mesh and survives transform changes.
+        """
+        if geometry:
+            cache = self._geometry_cache
+        else:
+            if self._transform_dirty:
+                self.update_transform()
+            cache = self._cache
+        if key not in cache:
+            cache[key] = build()
+        return cache[key]
+
+    @property
+    def transform(self):
+        """
+        Transformation matrix, rebuilt only after translation, rotation or scale changed.
+        """
+        if self._transform_dirty:
+            return self.update_transform()
+        return self._transform
+
+    @property
+    def inverse_transform(self):
+        return self.cached('inverse_transform', lambda: glm.inverse(self.transform))
+
+    @property
+    def inverse_transpose(self):
+        return self.cached('inverse_transpose', lambda: glm.transpose(self.inverse_transform))
+
+    def transform_matrices(self):
+        """
+        The transform, its inverse and inverse transpose as 4x4 float64 numpy arrays.
+        """
+        return self.cached('transform_matrices', lambda: (np.array(self.transform, dtype=np.float64),
+                                                          np.array(self.inverse_transform, dtype=np.float64),
+                                                          np.array(self.inverse_transpose, dtype=np.float64)))
+
+    @property
+    def world_vertices(self):
+        """
+        Vertices baked into world space as an (N, 3) float64 array.
+        """
+        def build():
+            transform = self.transform_matrices()[0]
+            return np.asarray(self.vertices, dtype=np.float64).reshape(-1, 3) @ transform[:3, :3].T + transform[:3, 3]
+        return self.cached('world_vertices', build)
+
+    @property
+    def world_normals(self):
+        """
+        Normals baked into world space (transformed as directions, not normalized) as an (N, 3) float64 array.
+        """
+        def build():
+            transform = self.transform_matrices()[0]
+            return np.asarray(self.normals, dtype=np.float64).reshape(-1, 3) @ transform[:3, :3].T
+        return self.cached('world_normals', build)
 
     def update_transform(self):
         """
         Update the transformation matrix based on translation, rotation, and scale.
+        Cached data derived from the transform is dropped only if the matrix actually changed.
+        If the object is edited on another thread while the matrix is being built, the result is returned
+        but not cached, so the next access rebuilds it from the new values.
         """
-        self.transform = glm.mat4(1.0)  # Reset to identity matrix
+        version = self.__dict__.get('_transform_version', 0)
+        transform = glm.mat4(1.0)  # Reset to identity matrix
 
         # Apply translation
-        self.transform = glm.translate(self.transform, self.translation)
+        transform = glm.translate(transform, self.translation)
 
         # Apply rotation using quaternion to avoid gimbal lock
         rotation_quaternion = glm.quat()
@@ -85,14 +212,33 @@ class Object():
         rotation_quaternion = glm.rotate(rotation_quaternion, glm.radians(self.rotation.z), glm.vec3(0.0, 0.0, 1.0))  # Rotate around Z axis
 
         # Convert quaternion to matrix and apply
-        self.transform = self.transform * glm.mat4_cast(rotation_quaternion)
+        transform = transform * glm.mat4_cast(rotation_quaternion)
 
         # Apply scale
-        self.transform = glm.scale(self.transform, self.scale)
+        transform = glm.scale(transform, self.scale)
+
+        with _transform_lock:
+            if self.__dict__.get('_transform_version', 0) == version:
+                if transform != self.__dict__.get('_transform'):
+                    self._cache.clear()
+                self.__dict__['_transform'] = transform
+                self.__dict__['_transform_dirty'] = False
+        return transform
 
     def get_texture_data(self):
-        if self.texture_data is None:
-            self.texture_data = np.array(Image.open(self.texture).convert('RGB'))
+        """
+        Decoded texture as a read-only (H, W, 3) uint8 array, shared with every object using the same image file.
+        The image file is checked on every call, so a texture edited on disk is decoded again.
+        """
+        try:
+            key = texture_cache.key(self.texture)
+        except OSError:
+            if self.texture_data is not None:
+                return self.texture_data  # File gone since it was decoded, keep using the decoded image
+            raise
+        if self.texture_data is None or key != self.texture_key:
+            self.texture_data = texture_cache.get(self.texture)
+            self.texture_key = key
         return self.texture_data
 
     def get_color_by_texcoord(self, texcoord):
@@ -101,7 +247,8 @@ class Object():
         texcoord should be normalized in the range [0, 1].
         """
         if self.texture:
-            texture_data = self.get_texture_data()
+            # Per-ray lookups use the image validated when the render was prepared
+            texture_data = self.texture_data if self.texture_data is not None else self.get_texture_data()
             # Convert the normalized texcoord to pixel coordinates
             width, height = texture_data.shape[1], texture_data.shape[0]
             x = int(texcoord[0] * (width - 1))
@@ -111,8 +258,126 @@ class Object():
         else:
             return self.color  # Return pure color if no texture is applied
 
+    def get_colors_by_texcoords(self, texcoords):
+        """
+        Vectorized version of get_color_by_texcoord.
+        texcoords is an (N, 2) array normalized in the range [0, 1], returns an (N, 3) array of colors.
+        """
+        texcoords = np.asarray(texcoords, dtype=np.float64).reshape(-1, 2)
+        if self.texture:
+            # Per-ray lookups use the image validated when the render was prepared
+            texture_data = self.texture_data if self.texture_data is not None else self.get_texture_data()
+            width, height = texture_data.shape[1], texture_data.shape[0]
+            x = np.clip((texcoords[:, 0] * (width - 1)).astype(np.int64), 0, width - 1)
+            y = np.clip((texcoords[:, 1] * (height - 1)).astype(np.int64), 0, height - 1)
+            return texture_data[y, x, :3] / 255.0
+        else:
+            return np.tile(np.asarray(self.color, dtype=np.float64)[:3], (len(texcoords), 1))
+
+
+def normalize_rows(vectors):
+    """
+    Normalize every row of an (N, 3) array.
+    """
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+def moller_trumbore(ray_origins, ray_directions, v0, edge1, edge2):
+    """
+    Möller–Trumbore test of every ray against every triangle.
+    ray_origins and ray_directions are (N, 3), v0, edge1 and edge2 are (T, 3).
+    Returns (t, u, v) as (N, T) arrays, t is np.inf where the ray misses the triangle.
+    """
+    d = ray_directions[:, None, :]
+    h = np.cross(d, edge2[None, :, :])
+    a = np.einsum('tk,ntk->nt', edge1, h)
+    valid = np.abs(a) >= 1e-6  # Not parallel to the triangle
+    f = np.divide(1.0, a, out=np.zeros_like(a), where=valid)
+    s = ray_origins[:, None, :] - v0[None, :, :]
+    u = f * np.einsum('ntk,ntk->nt', s, h)
+    q = np.cross(s, edge1[None, :, :])
+    v = f * np.einsum('ntk,ntk->nt', np.broadcast_to(d, q.shape), q)
+    t = f * np.einsum('tk,ntk->nt', edge2, q)
+    valid &= (u >= 0.0) & (u <= 1.0) & (v >= 0.0) & (u + v <= 1.0) & (t > 1e-6)
+    return np.where(valid, t, np.inf), u, v
+
+
+def intersect_triangles(ray_origins, ray_directions, v0, edge1, edge2, max_elements=1 << 18):
+    """
+    Vectorized Möller–Trumbore intersection of rays against all triangles at once.
+
+    Parameters:
+    ray_origins (np.ndarray): (3,) for a single ray or (N, 3) for N rays.
+    ray_directions (np.ndarray): Same shape as ray_origins.
+    v0, edge1, edge2 (np.ndarray): (T, 3) first vertex and the two edges of every triangle.
+    max_elements (int): Upper bound of ray x triangle pairs tested per chunk, limits memory usage.
+
+    Returns:
+    (t, triangle, u, v): nearest t (np.inf if missed), index of the hit triangle and the
+    barycentric coordinates of the hit. Scalars for a single ray, (N,) arrays otherwise.
+    """
+    single = np.ndim(ray_origins) == 1
+    ray_origins = np.asarray(ray_origins, dtype=np.float64).reshape(-1, 3)
+    ray_directions = np.asarray(ray_directions, dtype=np.float64).reshape(-1, 3)
+    n = len(ray_origins)
+
+    min_t = np.full(n, np.inf)
+    triangle = np.zeros(n, dtype=np.int64)
+    hit_u = np.zeros(n)
+    hit_v = np.zeros(n)
+
+    if len(v0):
+        chunk = max(1, max_elements // len(v0))
+        for start in range(0, n, chunk):
+            end = min(start + chunk, n)
+            t, u, v = moller_trumbore(ray_origins[start:end], ray_directions[start:end], v0, edge1, edge2)
+
+            rows = np.arange(end - start)
+            nearest = np.argmin(t, axis=1)
+            min_t[start:end] = t[rows, nearest]
+            triangle[start:end] = nearest
+            hit_u[start:end] = u[rows, nearest]
+            hit_v[start:end] = v[rows, nearest]
+
+    if single:
+        return min_t[0], triangle[0], hit_u[0], hit_v[0]
+    return min_t, triangle, hit_u, hit_v
+
+
+def occlude_triangles(ray_origins, ray_directions, v0, edge1, edge2, max_t, max_elements=1 << 18):
+    """
+    Any-hit version of intersect_triangles: whether each ray hits any triangle with 1e-6 < t < max_t.
+    Triangles are tested in chunks and rays that already found a blocker are not tested again.
+
+    Returns:
+    A bool for a single ray, an (N,) bool array otherwise.
+    """
+    single = np.ndim(ray_origins) == 1
+    ray_origins = np.asarray(ray_origins, dtype=np.float64).reshape(-1, 3)
+    ray_directions = np.asarray(ray_directions, dtype=np.float64).reshape(-1, 3)
+    max_t = np.broadcast_to(np.asarray(max_t, dtype=np.float64), (len(ray_origins),))
+    occluded = np.zeros(len(ray_origins), dtype=bool)
+
+    triangle_chunk = max(1, min(len(v0), max_elements // 64))
+    for triangle_start in range(0, len(v0), triangle_chunk):
+        triangles = slice(triangle_start, triangle_start + triangle_chunk)
+        active = np.flatnonzero(~occluded)
+        if len(active) == 0:
+            break
+        ray_chunk = max(1, max_elements // triangle_chunk)
+        for start in range(0, len(active), ray_chunk):
+            rays = active[start:start + ray_chunk]
+            t, _, _ = moller_trumbore(ray_origins[rays], ray_directions[rays], v0[triangles], edge1[triangles], edge2[triangles])
+            occluded[rays] = np.any(t < max_t[rays, None], axis=1)
+
+    if single:
+        return bool(occluded[0])
+    return occluded
+
 
 class Hitable(Object):
+    center = TrackedAttribute(vector=True)
+
     def __init__(self, id=None, name="Hitable", obj_type="Custom", vertices=[], normals=[], indices=[], texcoords=[],
                  translation=glm.vec3(0.0, 0.0, 0.0), rotation=glm.vec3(0.0, 0.0, 0.0), scale=glm.vec3(1.0, 1.0, 1.0),
                  color=glm.vec3(1.0, 1.0, 1.0), ambient=0.35, diffuse=0.9,
@@ -126,58 +391,101 @@ class Hitable(Object):
         Determine the closest intersection between the ray and the object.
         Returns the t value, the normal of the surface, and the color at the intersection.
         """
-        # Ensure indices is a 1D numpy array
-        self.indices = np.ravel(self.indices)
-        min_t = float('inf')
-        hit_normal = None
-        hit_color = None
-
-        # Update the transformation matrix
-        self.update_transform()
+        v0, edge1, edge2, normal = self.world_triangles()
+        t, triangle, u, v = intersect_triangles(np.array(ray_origin, dtype=np.float64), np.array(ray_direction, dtype=np.float64),
+                                                v0, edge1, edge2)
+        if not np.isfinite(t):
+            return None, None, None  # Not hit
 
-        for i in range(0, len(self.indices), 3):
-            v0 = glm.vec3(self.transform * glm.vec4(self.vertices[self.indices[i]], 1.0)) + self.center
-            v1 = glm.vec3(self.transform * glm.vec4(self.vertices[self.indices[i+1]], 1.0)) + self.center
-            v2 = glm.vec3(self.transform * glm.vec4(self.vertices[self.indices[i+2]], 1.0)) + self.center
-            normal = glm.normalize(glm.vec3(self.transform * glm.vec4(self.normals[self.indices[i]], 0.0)) +
-                                   glm.vec3(self.transform * glm.vec4(self.normals[self.indices[i+1]], 0.0)) +
-                                   glm.vec3(self.transform * glm.vec4(self.normals[self.indices[i+2]], 0.0)))
+        # Calculate the texture coordinates for the intersection point
+        indices = self.triangle_indices()[triangle]
+        texcoords = self.triangle_texcoords()
+        texcoord = u * texcoords[indices[1]] + v * texcoords[indices[2]] + (1 - u - v) * texcoords[indices[0]]
 
-            edge1 = v1 - v0
-            edge2 = v2 - v0
-            h = glm.cross(ray_direction, edge2)
-            a = glm.dot(edge1, h)
+        # Get the color from the texture
+        hit_color = self.get_color_by_texcoord(texcoord)
+        return float(t), glm.vec3(normal[triangle]), hit_color
 
-            if -1e-6 < a < 1e-6:
-                continue  # Parallel to the triangle
-            f = 1.0 / a
-            s = ray_origin - v0
-            u = f * glm.dot(s, h)
+    def triangle_indices(self):
+        """
+        Indices as a (T, 3) array, one row per triangle.
+        """
+        return self.cached('triangle_indices', lambda: np.ravel(self.indices).reshape(-1, 3), geometry=True)
 
-            if u < 0.0 or u > 1.0:
-                continue
+    def triangle_normals(self):
+        """
+        Sum of the three vertex normals of every triangle in object space, as a (T, 3) array.
+        """
+        def build():
+            indices = self.triangle_indices()
+            normals = np.asarray(self.normals, dtype=np.float64).reshape(-1, 3)
+            return normals[indices[:, 0]] + normals[indices[:, 1]] + normals[indices[:, 2]]
+        return self.cached('triangle_normals', build, geometry=True)
 
-            q = glm.cross(s, edge1)
-            v = f * glm.dot(ray_direction, q)
+    def triangle_texcoords(self):
+        """
+        Texture coordinates as an (N, 2) float64 array.
+        """
+        return self.cached('texcoords', lambda: np.asarray(self.texcoords, dtype=np.float64).reshape(-1, 2), geometry=True)
 
-            if v < 0.0 or u + v > 1.0:
-                continue
+    def world_triangles(self):
+        """
+        Every triangle of the mesh in world space, cached until the transform changes.
+        Returns v0, edge1, edge2 and the per-triangle normal as (T, 3) arrays.
+        """
+        def build():
+            indices = self.triangle_indices()
+            vertices = self.world_vertices + np.array(self.center, dtype=np.float64)
+            normals = self.world_normals
+            v0 = vertices[indices[:, 0]]
+            normal = normalize_rows(normals[indices[:, 0]] + normals[indices[:, 1]] + normals[indices[:, 2]])
+            return v0, vertices[indices[:, 1]] - v0, vertices[indices[:, 2]] - v0, normal
+        return self.cached('world_triangles', build)
+
+    def world_bounds(self):
+        """
+        Axis-aligned bounding box of the object in world space, returned as (min, max).
+        """
+        v0, edge1, edge2, _ = self.world_triangles()
+        corners = np.concatenate((v0, v0 + edge1, v0 + edge2))
+        return corners.min(axis=0), corners.max(axis=0)
 
-            t = f * glm.dot(edge2, q)
-            if t > 1e-6 and t < min_t:
-                min_t = t
-                hit_normal = normal
+    def intersect_batch(self, ray_origins, ray_directions):
+        """
+        Batched ray/triangle intersection, no normals or colors are computed (see surface_batch).
+        Returns (t, triangle, u, v) of the nearest hit of every ray, t is np.inf where the ray misses.
+        """
+        v0, edge1, edge2, _ = self.world_triangles()
+        return intersect_triangles(ray_origins, ray_directions, v0, edge1, edge2)
 
-                # Calculate the texture coordinates for the intersection point
-                # Get the texcoords from the triangle's vertices
-                texcoord = u * self.texcoords[self.indices[i+1]] + v * self.texcoords[self.indices[i+2]] + (1 - u - v) * self.texcoords[self.indices[i]]
+    def occluded(self, ray_origin, ray_direction, max_t):
+        """
+        Whether the ray hits the object closer than max_t. Stops at the first blocking triangle
+        and never computes normals or colors, meant for shadow rays.
+        """
+        return bool(self.occluded_batch(np.array(ray_origin, dtype=np.float64)[None],
+                                        np.array(ray_direction, dtype=np.float64)[None], max_t)[0])
 
-                # Get the color from the texture
-                hit_color = self.get_color_by_texcoord(texcoord)
+    def occluded_batch(self, ray_origins, ray_directions, max_t):
+        """
+        Batched version of occluded, returns an (N,) bool array.
+        """
+        v0, edge1, edge2, _ = self.world_triangles()
+        return occlude_triangles(ray_origins, ray_directions, v0, edge1, edge2, max_t)
 
-        if min_t == float('inf'):
-            return None, None, None  # Not hit
-        return min_t, hit_normal, hit_color
+    def surface_batch(self, ray_origins, ray_directions, t, triangle, u, v):
+        """
+        Normals and colors at the hits found by intersect_batch, every given ray is assumed to hit.
+        Only the hit triangles are transformed, so no world-space mesh has to be baked.
+        Returns two (N, 3) arrays.
+        """
+        transform = self.transform_matrices()[0]
+        normal = normalize_rows(self.triangle_normals()[triangle] @ transform[:3, :3].T)
+        indices = self.triangle_indices()[triangle]
+        texcoords = self.triangle_texcoords()
+        u, v = u[:, None], v[:, None]
+        texcoord = u * texcoords[indices[:, 1]] + v * texcoords[indices[:, 2]] + (1 - u - v) * texcoords[indices[:, 0]]
+        return normal, self.get_colors_by_texcoords(texcoord)
 
 class Sphere(Hitable):
     # 注：球体的center固定为 (0, 0, 0)，平移通过translation实现
@@ -190,13 +498,11 @@ class Sphere(Hitable):
 
     def hit(self, ray_origin, ray_direction):
         # Sphere-ray intersection using the quadratic formula
-        # Update the transformation matrix
-        self.update_transform()
         ray_direction = glm.normalize(ray_direction)
 
-        # 计算逆变换矩阵
-        inverse_transform = glm.inverse(self.transform)
-        inverse_transpose = glm.transpose(inverse_transform)
+        # 逆变换矩阵（已缓存，变换改变时才重新计算）
+        inverse_transform = self.inverse_transform
+        inverse_transpose = self.inverse_transpose
 
         # 将光线从世界坐标系转换到物体坐标系
         # 光线原点 (点) 需要乘以逆变换矩阵
@@ -255,6 +561,67 @@ class Sphere(Hitable):
 
         return t_world, normal_world, glm.vec3(hit_color)
 
+    def world_bounds(self):
+        # 变换后球体的包围盒：中心为变换后的球心，半边长为 size 乘以变换矩阵各行的模长
+        transform = self.transform_matrices()[0]
+        center = transform[:3, :3] @ np.array(self.center, dtype=np.float64) + transform[:3, 3]
+        half = self.size * np.linalg.norm(transform[:3, :3], axis=1)
+        return center - half, center + half
+
+    def intersect_batch(self, ray_origins, ray_directions):
+        # 与 hit 相同的解析求交，一次处理 N 条光线，只计算距离
+        n = len(ray_origins)
+        ray_directions = normalize_rows(ray_directions)
+
+        transform, inverse_transform, _ = self.transform_matrices()
+
+        # 将光线从世界坐标系转换到物体坐标系
+        ray_origin_obj = ray_origins @ inverse_transform[:3, :3].T + inverse_transform[:3, 3]
+        ray_direction_obj = normalize_rows(ray_directions @ inverse_transform[:3, :3].T)
+
+        oc = ray_origin_obj - np.array(self.center, dtype=np.float64)
+        a = np.einsum('ij,ij->i', ray_direction_obj, ray_direction_obj)
+        b = 2.0 * np.einsum('ij,ij->i', oc, ray_direction_obj)
+        c = np.einsum('ij,ij->i', oc, oc) - self.size * self.size
+        discriminant = b * b - 4.0 * a * c
+
+        root = np.sqrt(np.maximum(discriminant, 0.0))
+        t0 = (-b - root) / (2.0 * a)
+        t1 = (-b + root) / (2.0 * a)
+        t_obj = np.where(t0 > 1e-6, np.minimum(t0, t1), t1)
+        hit = (discriminant >= 0) & (t_obj >= 1e-6)
+
+        # 交点转换回世界坐标系后求距离
+        t_world = np.full(n, np.inf)
+        hit_point_obj = ray_origin_obj[hit] + t_obj[hit, None] * ray_direction_obj[hit]
+        hit_point_world = hit_point_obj @ transform[:3, :3].T + transform[:3, 3]
+        t_world[hit] = np.linalg.norm(hit_point_world - ray_origins[hit], axis=1)
+        return t_world, np.zeros(n, dtype=np.int64), np.zeros(n), np.zeros(n)
+
+    def occluded_batch(self, ray_origins, ray_directions, max_t):
+        # 解析求交只需距离，不计算法线与颜色
+        return self.intersect_batch(ray_origins, ray_directions)[0] < max_t
+
+    def surface_batch(self, ray_origins, ray_directions, t, triangle, u, v):
+        # 由世界坐标系下的交点求物体坐标系下的法线
+        _, inverse_transform, inverse_transpose = self.transform_matrices()
+        hit_point_world = ray_origins + t[:, None] * normalize_rows(ray_directions)
+        hit_point_obj = hit_point_world @ inverse_transform[:3, :3].T + inverse_transform[:3, 3]
+        normal_obj = normalize_rows(hit_point_obj)
+        normal_world = normalize_rows(normal_obj @ inverse_transpose[:3, :3].T)
+
+        if self.texture:
+            # 球面坐标映射到纹理坐标 [0, 1]
+            theta = np.arctan2(normal_obj[:, 2], normal_obj[:, 0]) % (2 * math.pi)
+            phi = np.arccos(np.clip(normal_obj[:, 1] / self.size, -1.0, 1.0))
+            u = 1 - (theta / (2 * math.pi))
+            v = phi / math.pi
+            hit_color = self.get_colors_by_texcoords(np.stack((u, v), axis=1))
+        else:
+            hit_color = np.tile(np.asarray(self.color, dtype=np.float64)[:3], (len(t), 1))
+
+        return normal_world, hit_color
+
 class Cuboid(Hitable):
     def __init__(self, id=None, name="Cuboid", obj_type="Cuboid", vertices=[], normals=[], indices=[], texcoords=[],
                  translation=glm.vec3(0.0, 0.0, 0.0), rotation=glm.vec3(0.0, 0.0, 0.0), scale=glm.vec3(1.0, 1.0, 1.0),
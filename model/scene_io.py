@@ -0,0 +1,211 @@
+'''
+Author: Wh_Xcjm
+Date: 2026-10-18 14:37:14
+LastEditor: Wh_Xcjm
+LastEditTime: 2026-10-18 14:45:53
+FilePath: \大作业\model\scene_io.py
+Description: 
+
+Copyright (c) 2025 by WhXcjm, All Rights Reserved. 
+Github: https://github.com/WhXcjm
+'''
+import json
+import os
+import glm
+import numpy as np
+from model.array_file import write_array_file, read_array_header, array_views
+from model.objects import Object, Hitable, Sphere, Cuboid, Plane
+from model.shape_generator import ShapeGenerator
+from utils.logger import logger
+
+# 场景描述中需要转换为 glm.vec3 的字段
+VECTOR_FIELDS = ('translation', 'rotation', 'scale', 'color', 'center')
+
+SHAPE_GENERATORS = {
+    'Sphere': ShapeGenerator.generate_sphere,
+    'Cuboid': ShapeGenerator.generate_cuboid,
+    'Plane': ShapeGenerator.generate_plane,
+    'OBJ': ShapeGenerator.load_obj,
+}
+
+DEFAULT_CAMERA = {
+    'eye': glm.vec3(0, 10, 20),
+    'center': glm.vec3(0, 0, 0),
+    'up': glm.vec3(0, 1, 0),
+    'fov': 60.0,
+    'near': 0.1,
+    'far': 100.0
+}
+
+
+def load_scene_json(path):
+    """
+    读取 JSON 场景描述，格式如下（除 objects 外均可省略）：
+    {
+        "camera": {"eye": [0, 10, 20], "center": [0, 0, 0], "up": [0, 1, 0], "fov": 60, "near": 0.1, "far": 100},
+        "light": {"position": [-2, 10, 5], "color": [1, 1, 1]},
+        "objects": [
+            {"type": "Plane", "size": 16, "texture": "assets/chessboard.jpg"},
+            {"type": "Sphere", "radius": 1.5, "translation": [0, 1.5, 0], "reflectivity": 0.4},
+            {"type": "OBJ", "filename": "models/bunny.obj", "scale": [10, 10, 10]}
+        ]
+    }
+    物体的其余字段直接作为 ShapeGenerator.generate_* / load_obj 的参数，纹理与模型路径相对于场景文件所在目录
+    :return: (objects, properties, light)，light 为 {'position', 'color'}
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        scene = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(path))
+
+    properties = dict(DEFAULT_CAMERA)
+    for key, value in scene.get('camera', {}).items():
+        properties[key] = glm.vec3(*value) if isinstance(value, list) else float(value)
+
+    light = scene.get('light', {})
+    light = {
+        'position': glm.vec3(*light.get('position', (-2.0, 10.0, 5.0))),
+        'color': glm.vec3(*light.get('color', (1.0, 1.0, 1.0)))
+    }
+
+    objects = []
+    for index, description in enumerate(scene.get('objects', [])):
+        description = dict(description)
+        shape = description.pop('type')
+        if shape not in SHAPE_GENERATORS:
+            raise ValueError(f"Unknown shape: {shape}")
+        for key in VECTOR_FIELDS:
+            if key in description:
+                description[key] = glm.vec3(*description[key])
+        for key in ('texture', 'filename'):
+            path_value = description.get(key)
+            if path_value and not os.path.isabs(path_value) and not os.path.exists(path_value):
+                description[key] = os.path.join(base_dir, path_value)
+        description.setdefault('id', index)
+        description.setdefault('name', f"{shape}_{index}")
+        objects.append(SHAPE_GENERATORS[shape](**description))
+
+    logger.info(f"Loaded scene {path} with {len(objects)} objects")
+    return objects, properties, light
+
+
+# 二进制场景文件（.mrs）：数组容器文件（见 model/array_file.py），
+# 头部记录相机、光源、物体的类型/变换/材质/纹理路径，几何数组只记录其在数据区中的下标，
+# 读取时整个文件一次读入，数组直接以 np.frombuffer 映射，无需任何文本解析
+OBJECT_CLASSES = {cls.__name__: cls for cls in (Object, Hitable, Sphere, Cuboid, Plane)}
+GEOMETRY_FIELDS = ('vertices', 'normals', 'indices', 'texcoords')
+MATERIAL_FIELDS = ('ambient', 'diffuse', 'specular', 'shininess', 'reflectivity')
+CAMERA_FIELDS = ('eye', 'center', 'up', 'fov', 'near', 'far')
+
+
+def _to_json(value):
+    """
+    glm 向量 / numpy 数组 / 数值转换为 JSON 可表示的值
+    """
+    if isinstance(value, (int, float, str)) or value is None:
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    return [float(v) for v in value]
+
+
+def save_scene(path, objects, properties=None, light=None):
+    """
+    保存场景到二进制场景文件。多个物体共享的几何数组（如同参数生成的几何体）只写入一次，读取后仍然共享
+    :param objects: 物体列表
+    :param properties: 相机参数（eye、center、up、fov、near、far），可省略
+    :param light: 光源 {'position', 'color'}，可省略
+    """
+    arrays = []
+    array_index = {}  # id(数组) -> 下标
+
+    def add_array(value):
+        index = array_index.get(id(value))
+        if index is None:
+            arrays.append(np.asarray(value))
+            index = array_index[id(value)] = len(arrays) - 1
+        return index
+
+    header_objects = []
+    for obj in objects:
+        if getattr(obj, 'removed', False):
+            continue
+        description = {
+            'class': type(obj).__name__ if type(obj).__name__ in OBJECT_CLASSES else 'Hitable',
+            'id': obj.id,
+            'name': obj.name,
+            'obj_type': obj.obj_type,
+            'translation': _to_json(obj.translation),
+            'rotation': _to_json(obj.rotation),
+            'scale': _to_json(obj.scale),
+            'color': _to_json(obj.color),
+            'texture': obj.texture,
+            'arrays': {field: add_array(getattr(obj, field)) for field in GEOMETRY_FIELDS},
+        }
+        description.update({field: _to_json(getattr(obj, field)) for field in MATERIAL_FIELDS})
+        if isinstance(obj, Hitable):
+            description['center'] = _to_json(obj.center)
+        if hasattr(obj, 'size'):
+            description['size'] = _to_json(obj.size)
+        header_objects.append(description)
+
+    header = {'objects': header_objects}
+    if properties is not None:
+        header['camera'] = {key: _to_json(properties[key]) for key in CAMERA_FIELDS if key in properties}
+    if light is not None:
+        header['light'] = {key: _to_json(value) for key, value in light.items()}
+    data_size = write_array_file(path, header, arrays)
+    logger.info(f"Saved scene {path} with {len(header_objects)} objects, {len(arrays)} arrays ({data_size} bytes)")
+
+
+def load_scene(path):
+    """
+    读取二进制场景文件。几何数组为直接映射文件内容的只读数组
+    :return: (objects, properties, light)，文件中未保存相机或光源时对应项为 None
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    header, data_start = read_array_header(data)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    arrays = array_views(np.frombuffer(data, dtype=np.uint8), header, data_start)
+
+    objects = []
+    for description in header['objects']:
+        cls = OBJECT_CLASSES[description['class']]
+        kwargs = {field: arrays[index] for field, index in description['arrays'].items()}
+        kwargs.update({field: description[field] for field in MATERIAL_FIELDS})
+        for field in VECTOR_FIELDS:
+            if description.get(field) is not None:
+                kwargs[field] = glm.vec3(*description[field])
+        texture = description['texture']
+        if texture and not os.path.isabs(texture) and not os.path.exists(texture):
+            texture = os.path.join(base_dir, texture)
+        obj = cls(id=description['id'], name=description['name'], obj_type=description['obj_type'], texture=texture, **kwargs)
+        if 'size' in description:
+            obj.size = description['size']
+        objects.append(obj)
+
+    properties = None
+    if 'camera' in header:
+        properties = dict(DEFAULT_CAMERA)
+        properties.update({key: glm.vec3(*value) if isinstance(value, list) else value for key, value in header['camera'].items()})
+    light = None
+    if 'light' in header:
+        light = {key: glm.vec3(*value) for key, value in header['light'].items()}
+
+    logger.info(f"Loaded scene {path} with {len(objects)} objects")
+    return objects, properties, light
+
+
+def open_scene(path):
+    """
+    按扩展名读取场景文件（.mrs 二进制场景或 JSON 场景描述），缺省的相机与光源取默认值
+    :return: (objects, properties, light)
+    """
+    if not path.lower().endswith('.mrs'):
+        return load_scene_json(path)
+    objects, properties, light = load_scene(path)
+    if properties is None:
+        properties = dict(DEFAULT_CAMERA)
+    if light is None:
+        light = {'position': glm.vec3(-2.0, 10.0, 5.0), 'color': glm.vec3(1.0, 1.0, 1.0)}
+    return objects, properties, light
@@ -1,11 +1,39 @@
 # model/shape_generator.py
 from utils.logger import logger
 from model.objects import *
+from model.obj_loader import load_obj_cached
 import numpy as np
 import math
+import os
+import weakref
 import glm
 
 class ShapeGenerator:
+    # 按生成参数缓存的网格数据，同参数的几何体共享同一份只读数组，
+    # 渲染时的加速结构（BVH）也因此可以在这些物体之间复用。
+    # 缓存只持有数组的弱引用，使用该网格的物体都被删除后条目随之释放
+    _mesh_cache = {}
+
+    @staticmethod
+    def cached_mesh(key, build):
+        """
+        返回参数 key 对应的 (vertices, normals, indices, texcoords)，没有物体仍在使用时调用 build 重新生成
+        """
+        refs = ShapeGenerator._mesh_cache.get(key)
+        mesh = tuple(ref() for ref in refs) if refs is not None else None
+        if mesh is None or any(array is None for array in mesh):
+            mesh = tuple(build())
+            for array in mesh:
+                array.flags.writeable = False
+            ShapeGenerator._mesh_cache[key] = refs = tuple(weakref.ref(array) for array in mesh)
+            weakref.finalize(mesh[0], ShapeGenerator._drop_cached_mesh, key, refs)
+        return mesh
+
+    @staticmethod
+    def _drop_cached_mesh(key, refs):
+        if ShapeGenerator._mesh_cache.get(key) is refs:
+            del ShapeGenerator._mesh_cache[key]
+
     @staticmethod
     def generate_sphere(radius=1.0, segments=32, rings=32, id=None, name="Sphere", obj_type="Sphere", 
                  translation=glm.vec3(0.0, 0.0, 0.0), rotation=glm.vec3(0.0, 0.0, 0.0), scale=None, 
@@ -16,6 +44,16 @@ class ShapeGenerator:
         if scale is None:
             scale = glm.vec3(radius, radius, radius)
         radius = 1.0
+        vertices, normals, indices, texcoords = ShapeGenerator.cached_mesh(
+            ("Sphere", segments, rings), lambda: ShapeGenerator.sphere_mesh(segments, rings))
+
+        obj = Sphere(vertices=vertices, normals=normals, indices=indices, texcoords=texcoords, id=id, name=name, obj_type=obj_type, translation=translation, rotation=rotation, scale=scale, color=color, ambient=ambient, diffuse=diffuse, specular=specular, shininess=shininess, reflectivity=reflectivity, texture=texture, center=center, size=radius)
+
+        obj.update_transform()
+        return obj
+
+    @staticmethod
+    def sphere_mesh(segments, rings, radius=1.0):
         vertices = []
         faces = []
         normals = []
@@ -43,11 +81,7 @@ class ShapeGenerator:
         vertices = np.array(vertices, dtype=np.float32)
         normals = np.array(normals, dtype=np.float32)
         texcoords = np.array(texcoords, dtype=np.float32)
-
-        obj = Sphere(vertices=vertices, normals=normals, indices=indices, texcoords=texcoords, id=id, name=name, obj_type=obj_type, translation=translation, rotation=rotation, scale=scale, color=color, ambient=ambient, diffuse=diffuse, specular=specular, shininess=shininess, reflectivity=reflectivity, texture=texture, center=center, size=radius)
-
-        obj.update_transform()
-        return obj
+        return vertices, normals, indices, texcoords
 
     @staticmethod
     def generate_cuboid(width=1.0, height=1.0, depth=1.0, id=None, name="Cuboid", obj_type="Cuboid",
@@ -55,7 +89,13 @@ class ShapeGenerator:
                  color=glm.vec3(1.0, 1.0, 1.0), ambient=0.35, diffuse=0.9, 
                  specular=0.25, shininess=8, reflectivity=0.2, texture=None, center=glm.vec3(0.0, 0.0, 0.0), size=1.0):
         logger.info(f"Generating cuboid with width={width}, height={height}, depth={depth}")
-        
+        vertices, normals, indices, texcoords = ShapeGenerator.cached_mesh(
+            ("Cuboid", width, height, depth), lambda: ShapeGenerator.cuboid_mesh(width, height, depth))
+
+        return Cuboid(vertices=vertices, normals=normals, indices=indices, texcoords=texcoords, id=id, name=name, obj_type=obj_type, translation=translation, rotation=rotation, scale=scale, color=color, ambient=ambient, diffuse=diffuse, specular=specular, shininess=shininess, reflectivity=reflectivity, texture=texture, center=center, size=size)
+
+    @staticmethod
+    def cuboid_mesh(width, height, depth):
         # 计算每个顶点的半边长度
         w, h, d = width / 2, height / 2, depth / 2
         
@@ -109,8 +149,7 @@ class ShapeGenerator:
         vertices = np.array(vertices, dtype=np.float32)
         normals = np.array(normals, dtype=np.float32)
         texcoords = np.array(texcoords, dtype=np.float32)
-
-        return Cuboid(vertices=vertices, normals=normals, indices=indices, texcoords=texcoords, id=id, name=name, obj_type=obj_type, translation=translation, rotation=rotation, scale=scale, color=color, ambient=ambient, diffuse=diffuse, specular=specular, shininess=shininess, reflectivity=reflectivity, texture=texture, center=center, size=size)
+        return vertices, normals, indices, texcoords
 
 
     @staticmethod
@@ -119,6 +158,13 @@ class ShapeGenerator:
                  color=glm.vec3(1.0, 1.0, 1.0), ambient=0.35, diffuse=0.9, 
                  specular=0.25, shininess=8, reflectivity=0.2, texture=None, center=glm.vec3(0.0, 0.0, 0.0)):
         logger.info(f"Generating plane with size={size}")
+        vertices, normals, indices, texcoords = ShapeGenerator.cached_mesh(
+            ("Plane", size), lambda: ShapeGenerator.plane_mesh(size))
+
+        return Plane(vertices=vertices, normals=normals, indices=indices, texcoords=texcoords, id=id, name=name, obj_type=obj_type, translation=translation, rotation=rotation, scale=scale, color=color, ambient=ambient, diffuse=diffuse, specular=specular, shininess=shininess, reflectivity=reflectivity, texture=texture, center=center, size=size)
+
+    @staticmethod
+    def plane_mesh(size):
         s = size / 2
         vertices = [
             # 四个顶点
@@ -142,8 +188,7 @@ class ShapeGenerator:
         vertices = np.array(vertices, dtype=np.float32)
         normals = np.array(normals, dtype=np.float32)
         texcoords = np.array(texcoords, dtype=np.float32)
-
-        return Plane(vertices=vertices, normals=normals, indices=indices, texcoords=texcoords, id=id, name=name, obj_type=obj_type, translation=translation, rotation=rotation, scale=scale, color=color, ambient=ambient, diffuse=diffuse, specular=specular, shininess=shininess, reflectivity=reflectivity, texture=texture, center=center, size=size)
+        return vertices, normals, indices, texcoords
 
     @staticmethod
     def generate_shape(shape_name, size, id, name):
@@ -160,3 +205,20 @@ class ShapeGenerator:
         else:
             logger.error(f"Unknown shape: {shape_name}")
             raise ValueError(f"Unknown shape: {shape_name}")
+
+    @staticmethod
+    def load_obj(filename, progress=None, id=None, name=None, obj_type="Custom",
+                 translation=glm.vec3(0.0, 0.0, 0.0), rotation=glm.vec3(0.0, 0.0, 0.0), scale=glm.vec3(1.0, 1.0, 1.0),
+                 color=glm.vec3(1.0, 1.0, 1.0), ambient=0.35, diffuse=0.9,
+                 specular=0.25, shininess=8, reflectivity=0.2, texture=None, center=glm.vec3(0.0, 0.0, 0.0)):
+        """
+        从 Wavefront OBJ 文件读取网格，生成自定义物体。解析结果缓存在磁盘上，再次导入时直接映射，见 load_obj_cached
+        :param progress: 进度回调 progress(fraction)，见 load_obj_arrays
+        """
+        logger.info(f"Loading OBJ mesh from {filename}")
+        vertices, normals, indices, texcoords = load_obj_cached(filename, progress=progress)
+        for array in (vertices, normals, indices, texcoords):
+            array.flags.writeable = False
+        if name is None:
+            name = os.path.splitext(os.path.basename(filename))[0]
+        return Hitable(vertices=vertices, normals=normals, indices=indices, texcoords=texcoords, id=id, name=name, obj_type=obj_type, translation=translation, rotation=rotation, scale=scale, color=color, ambient=ambient, diffuse=diffuse, specular=specular, shininess=shininess, reflectivity=reflectivity, texture=texture, center=center)
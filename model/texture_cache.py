@@ -0,0 +1,98 @@
+'''
+Author: Wh_Xcjm
+Date: 2026-10-18 14:47:05
+LastEditor: Wh_Xcjm
+LastEditTime: 2026-10-18 14:47:05
+FilePath: \大作业\model\texture_cache.py
+Description: 
+
+Copyright (c) 2025 by WhXcjm, All Rights Reserved. 
+Github: https://github.com/WhXcjm
+'''
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from PIL import Image
+from utils.logger import logger
+
+
+class TextureCache():
+    """
+    进程内共享的纹理缓存。同一图片文件（按真实路径、修改时间与大小区分）只解码一次，
+    使用同一纹理的物体拿到同一个只读数组，渲染时也因此只向共享内存拷贝一份。
+    缓存持有的纹理总字节数超过 budget 时按最久未使用的顺序淘汰（仍被物体引用的数组不受影响）
+    :param budget: 内存预算（字节）
+    """
+    def __init__(self, budget=256 * 1024 * 1024):
+        self._budget = budget
+        self.entries = OrderedDict()  # (路径, 修改时间, 大小) -> 数组
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()  # 界面线程与渲染线程都会读取纹理
+
+    @property
+    def budget(self):
+        return self._budget
+
+    @budget.setter
+    def budget(self, value):
+        with self.lock:
+            self._budget = value
+            self._evict()
+
+    @staticmethod
+    def key(path):
+        """
+        :return: 缓存键 (真实路径, 修改时间, 大小)，文件被修改后随之改变
+        """
+        real_path = os.path.realpath(path)
+        stat = os.stat(real_path)
+        return real_path, stat.st_mtime_ns, stat.st_size
+
+    def get(self, path):
+        """
+        :return: 纹理图片的只读 RGB 数组，形状为 (高, 宽, 3)，dtype 为 uint8
+        """
+        key = self.key(path)
+        real_path = key[0]
+        with self.lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return data
+        # 解码放在锁外，不阻塞其他纹理的读取
+        data = np.array(Image.open(real_path).convert('RGB'))
+        data.flags.writeable = False
+        with self.lock:
+            if key in self.entries:  # 其他线程同时解码了同一纹理
+                return self.entries[key]
+            self.misses += 1
+            # 文件已被修改的旧版本不会再被命中
+            for stale in [k for k in self.entries if k[0] == real_path]:
+                self.size -= self.entries.pop(stale).nbytes
+            self.entries[key] = data
+            self.size += data.nbytes
+            self._evict(keep=key)
+        logger.info(f"Decoded texture {path}: {data.shape[1]}x{data.shape[0]}")
+        return data
+
+    def _evict(self, keep=None):
+        while self.size > self._budget and len(self.entries) > (keep is not None):
+            key, data = next(iter(self.entries.items()))
+            if key == keep:
+                self.entries.move_to_end(key)
+                continue
+            del self.entries[key]
+            self.size -= data.nbytes
+            logger.debug(f"Evicted texture {key[0]} from cache")
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+texture_cache = TextureCache()
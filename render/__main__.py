@@ -0,0 +1,74 @@
+'''
+Author: Wh_Xcjm
+Date: 2026-10-18 14:37:14
+LastEditor: Wh_Xcjm
+LastEditTime: 2026-10-18 14:47:05
+FilePath: \大作业\render\__main__.py
+Description: 无界面批量渲染：python -m render scene.json [scene2.json ...] -o {name}.png --width 800 --height 600
+             不导入 PySide6 与 OpenGL，可在没有显示设备的服务器上运行
+
+Copyright (c) 2025 by WhXcjm, All Rights Reserved. 
+Github: https://github.com/WhXcjm
+'''
+import argparse
+import logging
+import os
+import time
+from model.scene_io import open_scene
+from model.texture_cache import texture_cache
+from render.core import RenderPool, create_ray_tracer
+from utils.logger import logger
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m render', description="Render scene files without a display.")
+    parser.add_argument('scenes', nargs='+', help="scene files (.mrs or .json)")
+    parser.add_argument('-o', '--output', default='{name}.png',
+                        help="output image path, {name} is replaced by the scene file name (default: {name}.png)")
+    parser.add_argument('--width', type=int, default=800)
+    parser.add_argument('--height', type=int, default=600)
+    parser.add_argument('--spl', type=int, default=3, help="samples per pixel along each axis")
+    parser.add_argument('--max-depth', type=int, default=5, help="maximum reflection depth")
+    parser.add_argument('--workers', type=int, default=None, help="render processes (default: CPU count)")
+    parser.add_argument('--engine', choices=('wavefront', 'recursive'), default='wavefront')
+    parser.add_argument('--tile-size', type=int, default=32)
+    parser.add_argument('--adaptive', action='store_true', help="adaptive anti-aliasing")
+    parser.add_argument('--texture-budget', type=int, default=256, help="texture cache memory budget in MB (default: 256)")
+    parser.add_argument('-v', '--verbose', action='store_true', help="print render logs")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.verbose:
+        logger.setLevel(logging.WARNING)
+    texture_cache.budget = args.texture_budget * 1024 * 1024
+
+    pool = RenderPool(args.workers)
+    try:
+        for path in args.scenes:
+            name = os.path.splitext(os.path.basename(path))[0]
+            output = args.output.format(name=name)
+
+            start = time.perf_counter()
+            objects, properties, light = open_scene(path)
+            loaded = time.perf_counter()
+
+            ray_tracer = create_ray_tracer(objects, properties, args.width, args.height, light['position'], light['color'],
+                                           args.max_depth, engine=args.engine, tile_size=args.tile_size, adaptive=args.adaptive)
+            ray_tracer.build_acceleration()
+            built = time.perf_counter()
+
+            ray_tracer.render(spl=args.spl, output=output, preview=False, pool=pool)
+            rendered = time.perf_counter()
+
+            pixels = args.width * args.height
+            print(f"{path} -> {output}: {args.width}x{args.height}, spl={args.spl}, {len(objects)} objects | "
+                  f"load {loaded - start:.3f}s, bvh {built - loaded:.3f}s, render {rendered - built:.3f}s "
+                  f"({pixels / (rendered - built):.0f} pixels/s), total {rendered - start:.3f}s")
+    finally:
+        pool.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,426 @@
+'''
+Author: Wh_Xcjm
+Date: 2026-10-18 14:19:05
+LastEditor: Wh_Xcjm
+LastEditTime: 2026-10-18 15:07:28
+FilePath: \大作业\render\bvh.py
+Description: 
+
+Copyright (c) 2025 by WhXcjm, All Rights Reserved. 
+Github: https://github.com/WhXcjm
+'''
+import weakref
+import numpy as np
+from model.objects import Hitable, Sphere, intersect_triangles, occlude_triangles
+
+
+def surface_area(bounds_min, bounds_max):
+    """
+    包围盒表面积，支持批量计算
+    """
+    extent = np.maximum(bounds_max - bounds_min, 0.0)
+    return 2.0 * (extent[..., 0] * extent[..., 1] + extent[..., 1] * extent[..., 2] + extent[..., 2] * extent[..., 0])
+
+
+class BVH():
+    """
+    以表面积启发式（SAH）构建的包围体层次结构。
+    节点保存在扁平数组中（可直接 pickle 给渲染进程）：
+    - node_min / node_max: 节点包围盒
+    - node_offset: 内部节点为左孩子下标（右孩子紧随其后），叶子节点为 order 中的起始位置
+    - node_count: 叶子节点的图元数，内部节点为 0
+    - node_axis: 内部节点的划分轴，用于决定遍历的先后顺序
+    - order: 按叶子顺序排列的图元下标
+    """
+    def __init__(self, bounds_min, bounds_max, leaf_size=8, max_leaf_size=32, bins=12, traversal_cost=1.0):
+        """
+        :param bounds_min: 每个图元包围盒的最小点，形状为 (P, 3)
+        :param bounds_max: 每个图元包围盒的最大点，形状为 (P, 3)
+        :param leaf_size: 图元数不超过该值时直接作为叶子
+        :param max_leaf_size: SAH 判定不划分时叶子允许的最大图元数
+        :param bins: SAH 分桶数
+        :param traversal_cost: 相对于一次图元求交的遍历代价
+        """
+        bounds_min = np.asarray(bounds_min, dtype=np.float64).reshape(-1, 3)
+        bounds_max = np.asarray(bounds_max, dtype=np.float64).reshape(-1, 3)
+        centroids = (bounds_min + bounds_max) / 2
+        count = len(bounds_min)
+
+        order = np.arange(count)
+        node_min, node_max, node_offset, node_count, node_axis = [], [], [], [], []
+
+        def new_node():
+            node_min.append(np.zeros(3))
+            node_max.append(np.zeros(3))
+            node_offset.append(0)
+            node_count.append(0)
+            node_axis.append(0)
+            return len(node_min) - 1
+
+        stack = [(new_node(), 0, count)]
+        while stack:
+            node, start, end = stack.pop()
+            index = order[start:end]
+            node_min[node] = bounds_min[index].min(axis=0) if len(index) else np.zeros(3)
+            node_max[node] = bounds_max[index].max(axis=0) if len(index) else np.zeros(3)
+            n = end - start
+
+            split = None
+            if n > leaf_size:
+                split = self._find_split(bounds_min[index], bounds_max[index], centroids[index], bins,
+                                         surface_area(node_min[node], node_max[node]), traversal_cost)
+                if split is None and n > max_leaf_size:
+                    # 图元中心重合或 SAH 认为不值得划分，但叶子过大：按中位数强制划分
+                    axis = int(np.argmax(node_max[node] - node_min[node]))
+                    mask = np.zeros(n, dtype=bool)
+                    mask[np.argsort(centroids[index, axis], kind='stable')[:n // 2]] = True
+                    split = (axis, mask)
+
+            if split is None:
+                node_offset[node] = start
+                node_count[node] = n
+                continue
+
+            axis, mask = split
+            order[start:end] = np.concatenate((index[mask], index[~mask]))
+            middle = start + int(np.count_nonzero(mask))
+            left = new_node()
+            right = new_node()
+            node_offset[node] = left
+            node_axis[node] = axis
+            stack.append((right, middle, end))
+            stack.append((left, start, middle))
+
+        self.node_min = np.array(node_min, dtype=np.float64).reshape(-1, 3)
+        self.node_max = np.array(node_max, dtype=np.float64).reshape(-1, 3)
+        self.node_offset = np.array(node_offset, dtype=np.int64)
+        self.node_count = np.array(node_count, dtype=np.int64)
+        self.node_axis = np.array(node_axis, dtype=np.int64)
+        self.order = order
+
+    @staticmethod
+    def _find_split(bounds_min, bounds_max, centroids, bins, parent_area, traversal_cost):
+        """
+        分桶 SAH：同时在三个轴上寻找代价最小的划分
+        :return: (axis, mask) 其中 mask 标记划分到左孩子的图元；不值得划分时返回 None
+        """
+        n = len(centroids)
+        centroid_min = centroids.min(axis=0)
+        extent = centroids.max(axis=0) - centroid_min
+        if parent_area <= 0 or not np.any(extent > 0):
+            return None
+
+        # 每个图元在三个轴上各自的桶号，三个轴的桶拼成 3 * bins 个
+        bucket = ((centroids - centroid_min) / np.where(extent > 0, extent, 1.0) * bins).astype(np.int64)
+        bucket = np.minimum(bucket, bins - 1)
+        key = (bucket + np.arange(3) * bins).ravel()
+
+        bucket_count = np.bincount(key, minlength=3 * bins).reshape(3, bins)
+        bucket_min = np.full((3 * bins, 3), np.inf)
+        bucket_max = np.full((3 * bins, 3), -np.inf)
+        np.minimum.at(bucket_min, key, np.repeat(bounds_min, 3, axis=0))
+        np.maximum.at(bucket_max, key, np.repeat(bounds_max, 3, axis=0))
+        bucket_min = bucket_min.reshape(3, bins, 3)
+        bucket_max = bucket_max.reshape(3, bins, 3)
+
+        # 前缀/后缀扫描得到每个划分位置左右两侧的包围盒
+        left_min = np.minimum.accumulate(bucket_min, axis=1)[:, :-1]
+        left_max = np.maximum.accumulate(bucket_max, axis=1)[:, :-1]
+        right_min = np.minimum.accumulate(bucket_min[:, ::-1], axis=1)[:, ::-1][:, 1:]
+        right_max = np.maximum.accumulate(bucket_max[:, ::-1], axis=1)[:, ::-1][:, 1:]
+        left_count = np.cumsum(bucket_count, axis=1)[:, :-1]
+        right_count = n - left_count
+
+        valid = (left_count > 0) & (right_count > 0) & (extent > 0)[:, None]
+        with np.errstate(invalid='ignore'):
+            cost = traversal_cost + (left_count * surface_area(left_min, left_max) +
+                                     right_count * surface_area(right_min, right_max)) / parent_area
+        cost = np.where(valid, cost, np.inf)
+        axis, split = np.unravel_index(int(np.argmin(cost)), cost.shape)
+        if not cost[axis, split] < n:  # 不划分（作为叶子）的代价为 n
+            return None
+        return int(axis), bucket[:, axis] <= split
+
+    def refit(self, bounds_min, bounds_max):
+        """
+        图元包围盒变化后保持拓扑不变，自底向上重新计算节点包围盒
+        孩子节点总是在父节点之后分配，因此逆序遍历即可
+        """
+        bounds_min = np.asarray(bounds_min, dtype=np.float64).reshape(-1, 3)
+        bounds_max = np.asarray(bounds_max, dtype=np.float64).reshape(-1, 3)
+        for node in range(len(self.node_count) - 1, -1, -1):
+            offset, count = self.node_offset[node], self.node_count[node]
+            if count > 0:
+                prims = self.order[offset:offset + count]
+                self.node_min[node] = bounds_min[prims].min(axis=0)
+                self.node_max[node] = bounds_max[prims].max(axis=0)
+            elif len(self.order):
+                self.node_min[node] = np.minimum(self.node_min[offset], self.node_min[offset + 1])
+                self.node_max[node] = np.maximum(self.node_max[offset], self.node_max[offset + 1])
+
+    def is_leaf(self, node):
+        return self.node_count[node] > 0
+
+    def traverse(self, ray_origins, ray_directions, max_t, leaf_test):
+        """
+        批量遍历：光线按节点分组下行，只有与节点包围盒相交且比当前最近距离更近的光线才会继续
+        :param max_t: 每条光线当前的最近距离，形状为 (N,)，会被 leaf_test 原地更新
+        :param leaf_test: 回调 leaf_test(rays, start, end)，测试光线子集 rays 与 order[start:end] 中的图元
+        """
+        n = len(ray_origins)
+        if n == 0 or len(self.order) == 0:
+            return
+        with np.errstate(divide='ignore'):
+            inverse_directions = 1.0 / ray_directions
+
+        stack = [(0, np.arange(n))]
+        while stack:
+            node, rays = stack.pop()
+            origins = ray_origins[rays]
+            inverse = inverse_directions[rays]
+            with np.errstate(invalid='ignore'):
+                t0 = (self.node_min[node] - origins) * inverse
+                t1 = (self.node_max[node] - origins) * inverse
+            # fmin / fmax 忽略 0 * inf 产生的 NaN
+            t_near = np.fmax.reduce(np.fmin(t0, t1), axis=1)
+            t_far = np.fmin.reduce(np.fmax(t0, t1), axis=1)
+            rays = rays[(t_near <= t_far) & (t_far >= 0) & (t_near < max_t[rays])]
+            if len(rays) == 0:
+                continue
+
+            if self.is_leaf(node):
+                start = self.node_offset[node]
+                leaf_test(rays, start, start + self.node_count[node])
+                continue
+
+            # 先访问光线方向上更近的孩子，以便尽早缩短最近距离
+            left = self.node_offset[node]
+            if np.sum(ray_directions[rays, self.node_axis[node]]) >= 0:
+                near, far = left, left + 1
+            else:
+                near, far = left + 1, left
+            stack.append((far, rays))
+            stack.append((near, rays))
+
+
+class MeshBVH():
+    """
+    底层加速结构（BLAS）：建立在物体坐标系下的网格三角形之上，与物体的变换无关，
+    因此同一网格的所有实例可以共享，物体移动时也无需重建
+    """
+    def __init__(self, vertices, indices, **kwargs):
+        triangles = np.ravel(indices).reshape(-1, 3)
+        vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+        v0 = vertices[triangles[:, 0]]
+        v1 = vertices[triangles[:, 1]]
+        v2 = vertices[triangles[:, 2]]
+        self.bvh = BVH(np.minimum(np.minimum(v0, v1), v2), np.maximum(np.maximum(v0, v1), v2), **kwargs)
+
+        # 三角形按 BVH 叶子顺序重排，使每个叶子对应一段连续区间
+        order = self.bvh.order
+        self.v0 = v0[order]
+        self.edge1 = (v1 - v0)[order]
+        self.edge2 = (v2 - v0)[order]
+        self.triangle = order
+        if len(order):
+            self.bounds = (self.bvh.node_min[0], self.bvh.node_max[0])
+        else:
+            self.bounds = (np.zeros(3), np.zeros(3))
+
+    def closest_hit(self, ray_origins, ray_directions, best_t):
+        """
+        物体坐标系下的最近交点查询
+        :param best_t: 每条光线当前的最近距离，命中更近的三角形时原地更新
+        :return: (三角形下标, u, v)，未找到更近交点的光线三角形下标为 -1
+        """
+        n = len(ray_origins)
+        triangle = np.full(n, -1, dtype=np.int64)
+        hit_u = np.zeros(n)
+        hit_v = np.zeros(n)
+
+        def leaf_test(rays, start, end):
+            t, index, u, v = intersect_triangles(ray_origins[rays], ray_directions[rays], self.v0[start:end],
+                                                 self.edge1[start:end], self.edge2[start:end])
+            closer = t < best_t[rays]
+            rays = rays[closer]
+            best_t[rays] = t[closer]
+            triangle[rays] = self.triangle[start + index[closer]]
+            hit_u[rays] = u[closer]
+            hit_v[rays] = v[closer]
+
+        self.bvh.traverse(ray_origins, ray_directions, best_t, leaf_test)
+        return triangle, hit_u, hit_v
+
+    def occluded(self, ray_origins, ray_directions, max_t):
+        """
+        物体坐标系下的任意交点查询，找到第一个遮挡三角形即停止该光线的遍历
+        :param max_t: 每条光线的最大距离
+        :return: 每条光线是否被遮挡
+        """
+        # 被遮挡的光线最大距离置为 -inf，之后遍历到的节点都会将其剔除
+        max_t = np.array(max_t, dtype=np.float64)
+
+        def leaf_test(rays, start, end):
+            blocked = occlude_triangles(ray_origins[rays], ray_directions[rays], self.v0[start:end],
+                                        self.edge1[start:end], self.edge2[start:end], max_t[rays])
+            max_t[rays[blocked]] = -np.inf
+
+        self.bvh.traverse(ray_origins, ray_directions, max_t, leaf_test)
+        return max_t == -np.inf
+
+
+# 按网格数组缓存的 BLAS。键为顶点与索引数组的 id，数组被回收时对应条目随之删除
+_mesh_bvh_cache = {}
+
+
+def get_mesh_bvh(obj: Hitable):
+    """
+    获取物体网格对应的 BLAS，共享同一组顶点/索引数组的物体（如 ShapeGenerator 生成的同参数几何体）复用同一个
+    """
+    vertices, indices = obj.vertices, obj.indices
+    if not isinstance(vertices, np.ndarray) or not isinstance(indices, np.ndarray):
+        return MeshBVH(vertices, indices)
+    key = (id(vertices), id(indices))
+    mesh_bvh = _mesh_bvh_cache.get(key)
+    if mesh_bvh is None:
+        mesh_bvh = MeshBVH(vertices, indices)
+        _mesh_bvh_cache[key] = mesh_bvh
+        weakref.finalize(vertices, _mesh_bvh_cache.pop, key, None)
+        weakref.finalize(indices, _mesh_bvh_cache.pop, key, None)
+    return mesh_bvh
+
+
+def transform_bounds(bounds_min, bounds_max, transform, offset):
+    """
+    包围盒经仿射变换（再平移 offset）后的轴对齐包围盒
+    """
+    corners = np.array([[x, y, z] for x in (bounds_min[0], bounds_max[0])
+                        for y in (bounds_min[1], bounds_max[1])
+                        for z in (bounds_min[2], bounds_max[2])])
+    corners = corners @ transform[:3, :3].T + transform[:3, 3] + offset
+    return corners.min(axis=0), corners.max(axis=0)
+
+
+class SceneBVH():
+    """
+    两级加速结构：
+    - 底层（BLAS）：每个网格一个物体坐标系下的 MeshBVH，在同一网格的所有实例间共享，只构建一次
+    - 顶层（TLAS）：以每个物体变换后的包围盒为图元的 BVH，物体移动后只需 refit 节点包围盒
+    解析球体直接作为顶层图元求交
+    """
+    def __init__(self, objects: list[Hitable], **kwargs):
+        self.objects = list(objects)
+        self.meshes = [None if isinstance(obj, Sphere) else get_mesh_bvh(obj) for obj in self.objects]
+        self.geometry = [(obj.vertices, obj.indices) for obj in self.objects]  # 构建各 BLAS 时的顶点与索引数组
+        self.transforms = [None] * len(self.objects)
+        self.inverse = np.zeros((len(self.objects), 4, 4))
+        self.centers = np.zeros((len(self.objects), 3))
+        self.bounds_min = np.zeros((len(self.objects), 3))
+        self.bounds_max = np.zeros((len(self.objects), 3))
+        for index in range(len(self.objects)):
+            self._update_instance(index)
+        self.bvh = BVH(self.bounds_min, self.bounds_max, leaf_size=1, max_leaf_size=4, **kwargs)
+
+    def _update_instance(self, index):
+        """
+        记录物体当前的变换并计算其世界坐标包围盒
+        """
+        obj = self.objects[index]
+        self.transforms[index] = obj.transform
+        if self.meshes[index] is None:
+            self.bounds_min[index], self.bounds_max[index] = obj.world_bounds()
+            return
+        transform, inverse_transform, _ = obj.transform_matrices()
+        self.inverse[index] = inverse_transform
+        self.centers[index] = np.array(obj.center, dtype=np.float64)
+        self.bounds_min[index], self.bounds_max[index] = transform_bounds(*self.meshes[index].bounds, transform, self.centers[index])
+
+    def matches(self, objects):
+        """
+        判断加速结构是否建立在同一组物体（及同样的网格）之上，是则可以通过 refit 复用。
+        物体的顶点或索引数组被替换过时底层结构已过时，需要重建
+        """
+        return len(objects) == len(self.objects) and all(a is b for a, b in zip(objects, self.objects)) and \
+            all(mesh is None or (obj.vertices is vertices and obj.indices is indices)
+                for obj, mesh, (vertices, indices) in zip(objects, self.meshes, self.geometry))
+
+    def refit(self):
+        """
+        检查各物体的变换，对移动过的物体更新包围盒并自底向上重算顶层节点包围盒，不重建任何结构
+        :return: 变换发生变化的物体数
+        """
+        changed = 0
+        for index, obj in enumerate(self.objects):
+            if obj.transform != self.transforms[index] or (self.meshes[index] is not None and
+                                                           not np.array_equal(self.centers[index], np.array(obj.center, dtype=np.float64))):
+                self._update_instance(index)
+                changed += 1
+        if changed:
+            self.bvh.refit(self.bounds_min, self.bounds_max)
+        return changed
+
+    def closest_hit(self, ray_origins, ray_directions):
+        """
+        最近交点查询
+        :return: (物体下标, 距离, 三角形下标, u, v)，未命中时物体下标为 -1、距离为 inf
+        """
+        n = len(ray_origins)
+        best_t = np.full(n, np.inf)
+        best_object = np.full(n, -1, dtype=np.int64)
+        best_triangle = np.zeros(n, dtype=np.int64)
+        best_u = np.zeros(n)
+        best_v = np.zeros(n)
+
+        def leaf_test(rays, start, end):
+            for index in self.bvh.order[start:end]:
+                origins, directions = ray_origins[rays], ray_directions[rays]
+                if self.meshes[index] is None:
+                    t = self.objects[index].intersect_batch(origins, directions)[0]
+                    closer = t < best_t[rays]
+                    best_t[rays[closer]] = t[closer]
+                    best_object[rays[closer]] = index
+                    continue
+
+                # 光线变换到物体坐标系（方向不归一化，距离参数 t 与世界坐标系一致）
+                inverse = self.inverse[index]
+                local_origins = (origins - self.centers[index]) @ inverse[:3, :3].T + inverse[:3, 3]
+                local_directions = directions @ inverse[:3, :3].T
+                local_t = best_t[rays]
+                triangle, u, v = self.meshes[index].closest_hit(local_origins, local_directions, local_t)
+                closer = triangle >= 0
+                hit_rays = rays[closer]
+                best_t[hit_rays] = local_t[closer]
+                best_object[hit_rays] = index
+                best_triangle[hit_rays] = triangle[closer]
+                best_u[hit_rays] = u[closer]
+                best_v[hit_rays] = v[closer]
+
+        self.bvh.traverse(ray_origins, ray_directions, best_t, leaf_test)
+        return best_object, best_t, best_triangle, best_u, best_v
+
+    def occluded(self, ray_origins, ray_directions, max_t):
+        """
+        阴影光线的任意交点查询：只需判断 max_t 之内是否存在遮挡，不求最近交点，也不计算法线和颜色
+        :param max_t: 每条光线的最大距离（如到光源的距离），形状为 (N,) 或标量
+        :return: 每条光线是否被遮挡
+        """
+        n = len(ray_origins)
+        max_t = np.array(np.broadcast_to(max_t, (n,)), dtype=np.float64)
+
+        def leaf_test(rays, start, end):
+            for index in self.bvh.order[start:end]:
+                rays = rays[max_t[rays] > -np.inf]
+                if len(rays) == 0:
+                    return
+                origins, directions = ray_origins[rays], ray_directions[rays]
+                if self.meshes[index] is None:
+                    blocked = self.objects[index].occluded_batch(origins, directions, max_t[rays])
+                else:
+                    inverse = self.inverse[index]
+                    local_origins = (origins - self.centers[index]) @ inverse[:3, :3].T + inverse[:3, 3]
+                    local_directions = directions @ inverse[:3, :3].T
+                    blocked = self.meshes[index].occluded(local_origins, local_directions, max_t[rays])
+                max_t[rays[blocked]] = -np.inf
+
+        self.bvh.traverse(ray_origins, ray_directions, max_t, leaf_test)
+        return max_t == -np.inf
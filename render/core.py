@@ -0,0 +1,783 @@
+'''
+Author: Wh_Xcjm
+Date: 2026-10-18 14:37:14
+LastEditor: Wh_Xcjm
+LastEditTime: 2026-10-18 15:00:58
+FilePath: \大作业\render\core.py
+Description: 
+
+Copyright (c) 2025 by WhXcjm, All Rights Reserved. 
+Github: https://github.com/WhXcjm
+'''
+from multiprocessing import Pool, RawValue, resource_tracker
+import numpy as np
+import matplotlib.pyplot as plt
+import glm
+import os
+import math
+import time
+from model.objects import *
+from model.shape_generator import *
+from render.bvh import SceneBVH
+from render.shared_scene import SharedArray, SharedArrayStore, SharedSceneLoader
+from utils.logger import *
+from PIL import Image
+
+def make_tiles(height, width, tile_size):
+    """
+    把图像划分为 tile_size x tile_size 的小块（边缘的块可能更小）
+    :return: 块的像素范围列表 [(sy, ey, sx, ex), ...]
+    """
+    return [(sy, min(sy + tile_size, height), sx, min(sx + tile_size, width))
+            for sy in range(0, height, tile_size) for sx in range(0, width, tile_size)]
+
+def order_tiles(tiles, height, width, costs=None):
+    """
+    确定块的调度顺序：给出估计耗时时按耗时从高到低（最慢的块最先开始，减少末尾等待），
+    否则（以及耗时相同时）从图像中心向外
+    """
+    def center_distance(tile):
+        sy, ey, sx, ex = tile
+        return ((sy + ey - height) / 2) ** 2 + ((sx + ex - width) / 2) ** 2
+
+    if costs is None:
+        return sorted(tiles, key=center_distance)
+    return [tile for _, tile in sorted(zip(costs, tiles), key=lambda item: (-item[0], center_distance(item[1])))]
+
+def ndc_to_world(x, y, i_VP):
+    z = 1.0
+    coords = glm.vec4(x, y, z, 1.0)
+    world_coords = i_VP * coords
+    # return glm.vec3(x, y, 0)
+    return glm.vec3(world_coords.x/world_coords.w, world_coords.y/world_coords.w, world_coords.z/world_coords.w)
+
+# 渲染进程中的状态：场景按版本号缓存，版本变化时才从共享内存重新还原；帧缓冲等共享数组按名称附加一次
+_worker_loader = None
+_worker_scene = None
+_worker_arrays = {}
+_worker_cancelled = None  # 主进程共享的已取消场景版本号，不超过该版本的任务直接跳过
+
+
+def init_render_worker(cancelled):
+    """
+    进程池 initializer，进程启动时调用一次
+    :param cancelled: RenderPool.cancelled
+    """
+    global _worker_loader, _worker_cancelled
+    _worker_loader = SharedSceneLoader()
+    _worker_cancelled = cancelled
+
+
+def _worker_array(name, shape):
+    """
+    附加到主进程创建的共享数组，已附加的直接复用
+    """
+    shared = _worker_arrays.get(name)
+    if shared is None:
+        shared = _worker_arrays[name] = SharedArray(shape, np.float64, name=name)
+    return shared.array
+
+
+def _worker_state(scene_key):
+    """
+    取得任务对应版本的场景、帧缓冲与累加缓冲，版本未变时直接复用进程中已还原的场景
+    """
+    global _worker_scene
+    version, payload_name, payload_size, segments, frame_name, frame_shape, accum_name = scene_key
+    if _worker_scene is None or _worker_scene[0] != version:
+        _worker_scene = None  # 先释放旧场景对共享内存的引用
+        payload = SharedArray((payload_size,), np.uint8, name=payload_name)
+        scene = _worker_loader.load(payload.array.tobytes(), segments)
+        payload.release()
+        _worker_scene = (version, scene)
+        # 释放主进程已替换掉的共享数组
+        for name in [name for name in _worker_arrays if name not in (frame_name, accum_name)]:
+            _worker_arrays.pop(name).release()
+    frame = _worker_array(frame_name, frame_shape)
+    accum = _worker_array(accum_name, frame_shape) if accum_name is not None else None
+    return _worker_scene[1], frame, accum
+
+
+def render_block_worker(args):
+    """
+    渲染一个矩形块，结果直接写入共享帧缓冲
+    :param args: (场景版本信息, 块的像素范围 (sy, ey, sx, ex), 采样方式)。采样方式为
+        None：一次完成全部 spl x spl 个子采样；
+        ('preview', step)：每 step x step 个像素只追踪一条中心光线，用于快速预览；
+        ('pass', (dy, dx), count)：追踪一个子采样点并累加，帧缓冲更新为已完成的 count 个子采样的平均值
+    :return: 完成的块的像素范围，任务所属的渲染已被取消时不做渲染，返回 None
+    """
+    scene_key, (sy, ey, sx, ex), sample = args
+    if scene_key[0] <= _worker_cancelled.value:
+        return None
+    (parent, i_VP, spl), frame, accum = _worker_state(scene_key)
+    ys, xs = parent.pixel_coordinates()
+    if sample is None and parent.adaptive:
+        # 取块外一圈像素（图像边界处重复边缘像素）用于比较相邻颜色差
+        rows = np.clip(np.arange(sy - 1, ey + 1), 0, len(ys) - 1)
+        cols = np.clip(np.arange(sx - 1, ex + 1), 0, len(xs) - 1)
+        frame[sy:ey, sx:ex], refined = render_block_adaptive(parent, ys[rows], xs[cols], i_VP, spl, parent.aa_threshold)
+        logger.debug(f"Adaptive block Y {sy}-{ey - 1}, X {sx}-{ex - 1}: refined {refined} of {(ey - sy) * (ex - sx)} pixels")
+    elif sample is None:
+        y_list = list(enumerate(ys))[sy:ey]
+        x_list = list(enumerate(xs))[sx:ex]
+        _, _, block_image = render_block(parent, y_list, x_list, sy, sx, i_VP, spl)
+        frame[sy:ey, sx:ex] = block_image
+    elif sample[0] == 'preview':
+        step = sample[1]
+        block_image = np.clip(trace_block(parent, ys[sy:ey:step], xs[sx:ex:step], i_VP, np.zeros((1, 2))), 0, 1)
+        frame[sy:ey, sx:ex] = np.repeat(np.repeat(block_image, step, axis=0), step, axis=1)[:ey - sy, :ex - sx]
+    else:
+        _, offset, count = sample
+        accum[sy:ey, sx:ex] += trace_block(parent, ys[sy:ey], xs[sx:ex], i_VP, np.array([offset]))
+        frame[sy:ey, sx:ex] = np.clip(accum[sy:ey, sx:ex] / count, 0, 1)
+    return sy, ey, sx, ex
+
+
+class RenderPool():
+    """
+    常驻的渲染进程池，由应用程序持有并在多次渲染间复用，避免每次渲染都重新创建进程、导入模块和传输整个场景。
+    场景数组保存在长期存在的共享内存中，每次渲染只拷贝新增或变化的数组，并以版本号通知各进程更新场景。
+    取消渲染时不终止进程：记下已取消的版本号，进程领取到该版本余下的块时立即跳过，进程与已还原的场景留给下一次渲染
+    """
+    def __init__(self, processes=None):
+        self.processes = processes or os.cpu_count()
+        self.pool = None
+        self.store = SharedArrayStore()
+        self.version = 0
+        self.payload = None
+        self.frame = None
+        self.accum = None
+        self.scene_key = None
+        self.cancelled = RawValue('q', 0)  # 已取消的最新场景版本号，由各渲染进程读取
+
+    def start(self):
+        """
+        启动进程池（首次渲染时自动调用），已启动则直接返回
+        """
+        if self.pool is None:
+            if os.name == 'posix':
+                # 先启动资源跟踪进程，渲染进程继承同一个跟踪进程，附加共享内存时不会各自启动并在退出时误删
+                resource_tracker.ensure_running()
+            self.pool = Pool(processes=self.processes, initializer=init_render_worker, initargs=(self.cancelled,))
+            logger.info(f"Started render pool with {self.processes} processes")
+
+    def prepare(self, scene, image, accumulate=False):
+        """
+        向渲染进程提交一帧的场景并准备共享帧缓冲
+        :param scene: 渲染进程使用的场景 (RayTracer, i_VP, spl)
+        :param image: 帧缓冲的初始内容，形状为 (height, width, 3)
+        :param accumulate: 是否另备一个清零的累加缓冲，供渐进渲染逐遍累加子采样
+        :return: 共享帧缓冲，map 返回的块结果写入 frame.array
+        """
+        self.start()
+        self.version += 1
+        payload, segments = self.store.share(scene)
+        if self.payload is not None:
+            self.payload.release()
+        self.payload = SharedArray((len(payload),), np.uint8)
+        self.payload.array[:] = np.frombuffer(payload, dtype=np.uint8)
+        if self.frame is None or self.frame.shape != image.shape:
+            for shared in (self.frame, self.accum):
+                if shared is not None:
+                    shared.release()
+            self.frame = SharedArray(image.shape, np.float64)
+            self.accum = None
+        self.frame.array[...] = image
+        if accumulate:
+            if self.accum is None:
+                self.accum = SharedArray(image.shape, np.float64)
+            self.accum.array[...] = 0
+        logger.info(f"Render pool scene version {self.version}: {len(payload)} bytes pickled, {self.store.copied} of {self.store.size} shared bytes copied")
+
+        self.scene_key = (self.version, self.payload.name, len(payload), segments, self.frame.name, self.frame.shape,
+                          self.accum.name if accumulate else None)
+        return self.frame
+
+    def map(self, tasks):
+        """
+        在进程池中渲染 prepare 提交的场景
+        :param tasks: [(块的像素范围, 采样方式), ...]，采样方式见 render_block_worker
+        :return: 迭代器，按完成顺序返回块的像素范围，调用 cancel 后尚未开始的块返回 None
+        """
+        return self.pool.imap_unordered(render_block_worker, [(self.scene_key, tile, sample) for tile, sample in tasks], chunksize=1)
+
+    def cancel(self):
+        """
+        取消当前场景版本的渲染：尚未开始的块不再渲染，正在渲染的块完成后即结束。
+        map 返回的迭代器仍需取尽，以确保没有进程还在写入帧缓冲
+        """
+        if self.cancelled.value < self.version:
+            self.cancelled.value = self.version
+            logger.info(f"Cancelled render pool scene version {self.version}")
+
+    def close(self):
+        """
+        关闭进程池并释放全部共享内存
+        """
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+            logger.info("Render pool shut down")
+        for shared in (self.payload, self.frame, self.accum):
+            if shared is not None:
+                shared.release()
+        self.payload = self.frame = self.accum = None
+        self.store.release()
+
+def render_block(parent, y_list, x_list, sy, sx, i_VP, spl):
+    """
+    渲染一个矩形块
+    :param y_list: 块的y坐标列表
+    :param x_list: 块的x坐标列表
+    :param spl: 每方向像素采样数
+    :return: 渲染块的结果（像素数据）
+    """
+    logger.debug(f"Rendering block: Y range {y_list[0][0]}-{y_list[-1][0]}, X range {x_list[0][0]}-{x_list[-1][0]}")
+    if parent.engine == 'wavefront':
+        block_image = render_block_wavefront(parent, y_list, x_list, i_VP, spl)
+        logger.debug(f"Finished rendering block: Y range {y_list[0][0]}-{y_list[-1][0]}, X range {x_list[0][0]}-{x_list[-1][0]}")
+        return sy, sx, block_image
+    block_image = np.zeros((len(y_list), len(x_list), 3))  # 单独的块图像数据
+    for i, y in y_list:
+        for j, x in x_list:
+            # 超采样
+            pixel_color = np.zeros(3)
+            for dy in np.linspace(-1, 1, spl):
+                for dx in np.linspace(-1, 1, spl):
+                    subpixel = ndc_to_world(
+                        x + dx / parent.width, y + dy / parent.height, i_VP)
+                    ray_direction = VectorUtils.normalize(
+                        subpixel - parent.camera)
+                    pixel_color += parent.trace_ray(parent.camera,
+                                                    ray_direction)
+
+            block_image[i-sy, j-sx] = np.clip(pixel_color / (spl * spl), 0, 1)
+        # logger.info(f"Finished rendering line {i} : X range {x_list[0][0]}-{x_list[-1][0]}")
+    logger.debug(f"Finished rendering block: Y range {y_list[0][0]}-{y_list[-1][0]}, X range {x_list[0][0]}-{x_list[-1][0]}")
+    return sy, sx, block_image  # 返回渲染结果
+
+def generate_camera_rays(parent, ys, xs, i_VP, offsets, grid=True):
+    """
+    批量生成一个块内所有像素、所有子采样点的相机光线
+    :param ys: 块内像素的 NDC y 坐标数组
+    :param xs: 块内像素的 NDC x 坐标数组
+    :param offsets: 子采样偏移 (dy, dx) 数组，形状为 (S, 2)
+    :param grid: 为 True 时 ys、xs 分别为行、列坐标，像素为二者构成的网格；为 False 时为等长的逐像素坐标
+    :return: 光线方向数组，形状为 (len(ys), len(xs), S, 3)，grid 为 False 时为 (len(ys), S, 3)
+    """
+    ys = np.asarray(ys, dtype=np.float64)[..., None]
+    xs = np.asarray(xs, dtype=np.float64)[..., None]
+    if grid:
+        ys, xs = ys[:, None], xs[None, :]
+    ys = ys + offsets[:, 0] / parent.height
+    xs = xs + offsets[:, 1] / parent.width
+    ys, xs = np.broadcast_arrays(ys, xs)
+    coords = np.stack((xs, ys, np.ones_like(xs), np.ones_like(xs)), axis=-1)
+    world_coords = coords @ np.array(i_VP, dtype=np.float64).T
+    subpixels = world_coords[..., :3] / world_coords[..., 3:]
+    return normalize_rows(subpixels - np.array(parent.camera, dtype=np.float64))
+
+def subsample_offsets(spl):
+    """
+    超采样网格上全部子采样点的偏移 (dy, dx)
+    :return: 形状为 (spl * spl, 2) 的数组
+    """
+    grid = np.linspace(-1, 1, spl)
+    return np.stack(np.meshgrid(grid, grid, indexing='ij'), axis=-1).reshape(-1, 2)
+
+def progressive_order(offsets):
+    """
+    渐进渲染时子采样点的使用顺序：先取最靠近像素中心的点，之后每次取离已选点最远的点，使中间结果的采样尽量均匀
+    """
+    remaining = list(range(len(offsets)))
+    order = [min(remaining, key=lambda i: np.sum(offsets[i] ** 2))]
+    remaining.remove(order[0])
+    while remaining:
+        distance = [min(np.sum((offsets[i] - offsets[j]) ** 2) for j in order) for i in remaining]
+        order.append(remaining.pop(int(np.argmax(distance))))
+    return offsets[order]
+
+def trace_block(parent, ys, xs, i_VP, offsets, grid=True):
+    """
+    追踪一个矩形块内每个像素在给定子采样点上的相机光线
+    :param ys: 块内像素的 NDC y 坐标数组
+    :param xs: 块内像素的 NDC x 坐标数组
+    :param offsets: 子采样偏移 (dy, dx) 数组，形状为 (S, 2)
+    :param grid: 同 generate_camera_rays
+    :return: 每个像素所有子采样颜色之和，形状为 (len(ys), len(xs), 3)，grid 为 False 时为 (len(ys), 3)
+    """
+    if parent.engine != 'wavefront':
+        pixels = [(y, x) for y in ys for x in xs] if grid else list(zip(ys, xs))
+        pixel_color = np.zeros((len(pixels), 3))
+        for k, (y, x) in enumerate(pixels):
+            for dy, dx in offsets:
+                subpixel = ndc_to_world(x + dx / parent.width, y + dy / parent.height, i_VP)
+                pixel_color[k] += parent.trace_ray(parent.camera, VectorUtils.normalize(subpixel - parent.camera))
+        return pixel_color.reshape((len(ys), len(xs), 3) if grid else (len(ys), 3))
+
+    directions = generate_camera_rays(parent, ys, xs, i_VP, offsets, grid)
+    shape = directions.shape
+    directions = directions.reshape(-1, 3)
+    origins = np.broadcast_to(np.array(parent.camera, dtype=np.float64), directions.shape)
+
+    colors = np.zeros_like(directions)
+    for start in range(0, len(directions), parent.batch_size):
+        end = start + parent.batch_size
+        colors[start:end] = parent.trace_rays(origins[start:end], directions[start:end])
+    return colors.reshape(shape).sum(axis=-2)
+
+def render_block_adaptive(parent, ys, xs, i_VP, spl, threshold):
+    """
+    自适应超采样渲染一个矩形块：先为每个像素追踪一条中心光线，只对与相邻像素颜色差超过 threshold 的像素
+    （边缘、纹理细节、反射等）追踪完整的 spl x spl 子采样网格，平坦区域只需一条光线
+    :param ys: 块内像素的 NDC y 坐标数组，前后各多一行相邻块的像素用于比较边界处的颜色差
+    :param xs: 块内像素的 NDC x 坐标数组，左右各多一列
+    :return: (渲染块的结果（不含边框）, 细化的像素数)
+    """
+    center = np.clip(trace_block(parent, ys, xs, i_VP, np.zeros((1, 2))), 0, 1)
+    # 与上下左右相邻像素的最大颜色差，图像边界处边框由 clip 后的下标重复边缘像素
+    inner = center[1:-1, 1:-1]
+    contrast = np.zeros(inner.shape[:2])
+    for neighbour in (center[:-2, 1:-1], center[2:, 1:-1], center[1:-1, :-2], center[1:-1, 2:]):
+        contrast = np.maximum(contrast, np.abs(inner - neighbour).max(axis=-1))
+    block_image = inner.copy()
+    rows, cols = np.nonzero(contrast > threshold)
+    if len(rows) and spl > 1:
+        pixel_color = trace_block(parent, np.asarray(ys)[rows + 1], np.asarray(xs)[cols + 1], i_VP, subsample_offsets(spl), grid=False)
+        block_image[rows, cols] = np.clip(pixel_color / (spl * spl), 0, 1)
+    return block_image, len(rows)
+
+def render_block_wavefront(parent, y_list, x_list, i_VP, spl):
+    """
+    以 wavefront 方式渲染一个矩形块：一次生成块内全部相机光线并批量追踪
+    :return: 渲染块的结果（像素数据）
+    """
+    pixel_color = trace_block(parent, [y for _, y in y_list], [x for _, x in x_list], i_VP, subsample_offsets(spl))
+    return np.clip(pixel_color / (spl * spl), 0, 1)
+
+class VectorUtils:
+    @staticmethod
+    def normalize(vector):
+        return vector / np.linalg.norm(vector)
+
+    @staticmethod
+    def reflected(ray_direction, normal):
+        return ray_direction - 2 * np.dot(ray_direction, normal) * normal
+
+    @staticmethod
+    def refracted(ray_direction, normal, ior):
+        cos_theta_i = -np.dot(ray_direction, normal)
+        sin_theta_t2 = ior ** 2 * (1 - cos_theta_i ** 2)
+        if sin_theta_t2 > 1:
+            return VectorUtils.reflected(ray_direction, normal)
+        cos_theta_t = np.sqrt(1 - sin_theta_t2)
+        refracted_direction = ior * ray_direction + \
+            (ior * cos_theta_i - cos_theta_t) * normal
+        return refracted_direction
+
+class CallbackSignal():
+    """
+    不依赖 Qt 的简单信号：connect 注册回调，emit 时依次调用，接口与 Qt 信号一致
+    """
+    def __init__(self):
+        self.callbacks = []
+
+    def connect(self, callback):
+        self.callbacks.append(callback)
+
+    def emit(self, *args):
+        for callback in self.callbacks:
+            callback(*args)
+
+class TracerCallbacks():
+    """
+    RayTracer 默认的进度回调，无界面渲染时使用；界面中由 TracerSignals 替代
+    """
+    def __init__(self):
+        self.progress_update = CallbackSignal()  # 用于传递进度和渲染图像
+        self.finished = CallbackSignal()  # 渲染完成时调用
+
+class RayTracer():
+    def __init__(self, width, height, max_depth, camera, light, objects: list[Hitable], screen, image, VP, engine='wavefront', batch_size=65536, accel=None, tile_size=32, tile_order='cost', progressive=False, preview_step=4, adaptive=False, aa_threshold=0.05, signals=None):
+        """
+        :param engine: 渲染引擎，'wavefront' 为批量光线追踪，'recursive' 为逐像素递归追踪
+        :param batch_size: wavefront 模式下每批追踪的最大光线数，用于限制内存占用
+        :param accel: 上一次渲染的场景加速结构，物体未增删时只需 refit 即可复用
+        :param tile_size: 渲染任务的块边长（像素）
+        :param tile_order: 块的调度顺序，'cost' 按探测光线估计的耗时从高到低，'center' 从图像中心向外
+        :param progressive: 渐进渲染，先以低分辨率、单采样快速得到整帧预览，之后每遍为所有像素增加一个子采样，
+            逐遍累加平均直至达到 spl x spl 个子采样或被 stop 中止
+        :param preview_step: 渐进渲染预览遍的降采样倍数
+        :param adaptive: 自适应超采样，每个像素先追踪一条光线，只对与相邻像素颜色差超过 aa_threshold 的像素
+            追踪完整的 spl x spl 子采样（渐进渲染时不生效）
+        :param signals: 进度通知对象，需提供 progress_update 与 finished 两个信号，默认为不依赖 Qt 的 TracerCallbacks
+        """
+        self.signals = signals if signals is not None else TracerCallbacks()
+        self.width = width
+        self.height = height
+        self.max_depth = max_depth
+        self.camera = camera
+        self.light = light
+        self.objects = objects
+        self.screen = screen
+        self.image = image
+        self.VP = VP
+        self.engine = engine
+        self.batch_size = batch_size
+        self.accel = accel  # 场景两级 BVH，渲染前构建或 refit
+        self.tile_size = tile_size
+        self.tile_order = tile_order
+        self.progressive = progressive
+        self.preview_step = preview_step
+        self.adaptive = adaptive
+        self.aa_threshold = aa_threshold
+        self.stopped = False
+        self.cancelled = False
+        self.pool = None  # 正在使用的 RenderPool，供 cancel 通知渲染进程
+
+    def estimate_tile_costs(self, tiles, i_VP, probes=2):
+        """
+        用少量探测光线估计每个块的渲染耗时：每块发射 probes x probes 条主光线，
+        未命中的光线只需一次求交，命中的光线还需阴影光线，并按物体反射率估计后续反射光线的数量
+        :return: 每个块的估计耗时（相对值）
+        """
+        ys, xs = self.pixel_coordinates()
+        fractions = (np.arange(probes) + 0.5) / probes
+        directions = []
+        for sy, ey, sx, ex in tiles:
+            py = ys[(sy + fractions * (ey - sy)).astype(int)]
+            px = xs[(sx + fractions * (ex - sx)).astype(int)]
+            directions.append(generate_camera_rays(self, py, px, i_VP, np.zeros((1, 2))).reshape(-1, 3))
+        directions = np.concatenate(directions)
+        origins = np.broadcast_to(np.array(self.camera, dtype=np.float64), directions.shape)
+        index = self.accel.closest_hit(origins, directions)[0]
+
+        reflectivity = np.array([obj.reflectivity for obj in self.objects] + [0.0], dtype=np.float64)[index]
+        cost = np.where(index >= 0, 2.0, 1.0)
+        strength = reflectivity.copy()
+        for _ in range(1, self.max_depth):
+            bounce = (index >= 0) & (strength >= 0.1)
+            cost += 2.0 * bounce
+            strength *= reflectivity
+        return cost.reshape(len(tiles), -1).mean(axis=1)
+
+    def build_acceleration(self):
+        """
+        构建场景加速结构（两级 BVH），在分发渲染任务前调用，随 RayTracer 一同传给渲染进程。
+        物体集合未变化时只对移动过的物体 refit 顶层结构，网格的底层结构始终复用
+        """
+        if self.accel is not None and self.accel.matches(self.objects):
+            changed = self.accel.refit()
+            logger.info(f"Refitted scene BVH, {changed} of {len(self.objects)} objects moved")
+        else:
+            self.accel = SceneBVH(self.objects)
+            logger.info(f"Built scene BVH over {len(self.objects)} objects")
+
+    def trace_ray(self, ray_origin, ray_direction, current_depth=0, current_strength=1.0):
+        if current_depth >= self.max_depth:
+            return np.zeros(3)  # 如果递归深度超出，返回黑色
+
+        if current_strength < 0.1:
+            return np.zeros(3)
+
+        obj, min_distance, N, PColor = self.nearest_intersected_object(
+            ray_origin, ray_direction)
+        if obj is None:
+            return np.zeros(3)  # 没有交点，返回黑色
+
+        I = ray_origin + min_distance * ray_direction
+
+        P = I + 1e-3 * N  # 防止光线陷入物体
+
+        # 计算光线是否被遮挡（阴影判断）
+        PL = VectorUtils.normalize(self.light['position'] - P)
+        is_shadowed = self.occluded(P, PL, np.linalg.norm(self.light['position'] - I))
+
+        # 计算光照
+        illumination = np.zeros(3)
+
+        # 环境光
+        illumination += obj.ambient * PColor * self.light['ambient']
+
+        if not is_shadowed:
+            # 漫反射
+            illumination += obj.diffuse * PColor * \
+                self.light['diffuse'] * max(np.dot(PL, N), 0)
+
+            # 高光
+            PC = VectorUtils.normalize(self.camera - P)
+            H = VectorUtils.normalize(PL + PC)  # 半程向量
+            illumination += obj.specular * PColor * \
+                self.light['specular'] * \
+                (max(np.dot(N, H), 0) ** (obj.shininess))
+
+        # 反射
+        reflection_color = np.zeros(3)
+        reflection_ray_direction = VectorUtils.reflected(ray_direction, N)
+        reflection_color += obj.reflectivity * (PColor + np.array([1, 1, 1])) / 2 * \
+            self.trace_ray(P, reflection_ray_direction,
+                   current_depth + 1, current_strength * obj.reflectivity)
+
+        # 综合结果（反射 + 光照）
+        color = illumination + reflection_color
+        return np.clip(color, 0, 1)  # 确保颜色值在合法范围内
+
+    def nearest_intersected_object(self, ray_origin, ray_direction):
+        index, distance, normal, color = self.nearest_intersected_objects(
+            np.array(ray_origin, dtype=np.float64)[None], np.array(ray_direction, dtype=np.float64)[None])
+        if index[0] < 0:
+            return None, np.inf, None, None
+        return self.objects[index[0]], distance[0], normal[0], color[0]
+
+    def nearest_intersected_objects(self, ray_origins, ray_directions):
+        """
+        nearest_intersected_object 的批量版本，通过 BVH 查询最近交点，只对最终命中的物体计算法线和颜色
+        :return: 物体下标（未命中为 -1）、距离（未命中为 inf）、法线、颜色
+        """
+        if self.accel is None:
+            self.build_acceleration()
+        n = len(ray_origins)
+        normal_to_surface = np.zeros((n, 3))
+        final_color = np.zeros((n, 3))
+
+        nearest_index, min_distance, triangle, u, v = self.accel.closest_hit(ray_origins, ray_directions)
+        for index in np.unique(nearest_index[nearest_index >= 0]):
+            rays = nearest_index == index
+            normal_to_surface[rays], final_color[rays] = self.objects[index].surface_batch(
+                ray_origins[rays], ray_directions[rays], min_distance[rays], triangle[rays], u[rays], v[rays])
+
+        return nearest_index, min_distance, normal_to_surface, final_color
+
+    def occluded(self, ray_origin, ray_direction, max_t):
+        """
+        判断光线在 max_t 距离内是否被任意物体遮挡（阴影判断），找到任一遮挡即停止，不计算法线和颜色
+        """
+        return bool(self.occluded_batch(np.array(ray_origin, dtype=np.float64)[None],
+                                        np.array(ray_direction, dtype=np.float64)[None], max_t)[0])
+
+    def occluded_batch(self, ray_origins, ray_directions, max_t):
+        """
+        occluded 的批量版本
+        :param max_t: 每条光线的最大距离，形状为 (N,) 或标量
+        :return: 每条光线是否被遮挡，形状为 (N,)
+        """
+        if self.accel is None:
+            self.build_acceleration()
+        return self.accel.occluded(ray_origins, ray_directions, max_t)
+
+    def trace_rays(self, ray_origins, ray_directions):
+        """
+        trace_ray 的 wavefront 版本：主光线、阴影光线和反射光线按深度逐层批量处理，
+        每层结束后压缩掉已终止的光线，最后自底向上合成颜色，结果与逐条递归一致
+        :param ray_origins: 光线起点，形状为 (N, 3)
+        :param ray_directions: 光线方向（单位向量），形状为 (N, 3)
+        :return: 每条光线的颜色，形状为 (N, 3)
+        """
+        n = len(ray_origins)
+        light_position = np.array(self.light['position'], dtype=np.float64)
+        light_ambient = np.array(self.light['ambient'], dtype=np.float64)
+        light_diffuse = np.array(self.light['diffuse'], dtype=np.float64)
+        light_specular = np.array(self.light['specular'], dtype=np.float64)
+        camera = np.array(self.camera, dtype=np.float64)
+
+        # 材质参数按物体下标查表
+        ambient = np.array([obj.ambient for obj in self.objects], dtype=np.float64)
+        diffuse = np.array([obj.diffuse for obj in self.objects], dtype=np.float64)
+        specular = np.array([obj.specular for obj in self.objects], dtype=np.float64)
+        shininess = np.array([obj.shininess for obj in self.objects], dtype=np.float64)
+        reflectivity = np.array([obj.reflectivity for obj in self.objects], dtype=np.float64)
+
+        origins = np.asarray(ray_origins, dtype=np.float64)
+        directions = np.asarray(ray_directions, dtype=np.float64)
+        strengths = np.ones(n)
+        parents = np.arange(n)  # 每条光线在上一层中的下标
+        levels = []  # 每层记录 (parents, illumination, reflection_factor)
+
+        for current_depth in range(self.max_depth):
+            # 压缩：去掉强度过低的光线
+            alive = strengths >= 0.1
+            origins, directions, strengths, parents = origins[alive], directions[alive], strengths[alive], parents[alive]
+            if len(origins) == 0:
+                break
+
+            index, distance, N, PColor = self.nearest_intersected_objects(origins, directions)
+
+            # 压缩：去掉没有交点的光线
+            hit = index >= 0
+            origins, directions, strengths, parents = origins[hit], directions[hit], strengths[hit], parents[hit]
+            index, distance, N, PColor = index[hit], distance[hit], N[hit], PColor[hit]
+            if len(origins) == 0:
+                break
+
+            I = origins + distance[:, None] * directions
+            P = I + 1e-3 * N  # 防止光线陷入物体
+
+            # 阴影光线
+            PL = normalize_rows(light_position - P)
+            is_lit = ~self.occluded_batch(P, PL, np.linalg.norm(light_position - I, axis=1))
+
+            # 环境光
+            illumination = ambient[index, None] * PColor * light_ambient
+
+            # 漫反射
+            diffuse_term = np.maximum(np.einsum('ij,ij->i', PL, N), 0)
+            illumination += is_lit[:, None] * diffuse[index, None] * PColor * light_diffuse * diffuse_term[:, None]
+
+            # 高光
+            PC = normalize_rows(camera - P)
+            H = normalize_rows(PL + PC)  # 半程向量
+            specular_term = np.maximum(np.einsum('ij,ij->i', N, H), 0) ** shininess[index]
+            illumination += is_lit[:, None] * specular[index, None] * PColor * light_specular * specular_term[:, None]
+
+            # 反射光线作为下一层
+            reflection_factor = reflectivity[index, None] * (PColor + 1) / 2
+            levels.append((parents, illumination, reflection_factor))
+
+            origins = P
+            directions = directions - 2 * np.einsum('ij,ij->i', directions, N)[:, None] * N
+            strengths = strengths * reflectivity[index]
+            parents = np.arange(len(P))
+
+        # 自底向上合成（反射 + 光照）
+        colors = np.zeros((n, 3))
+        child_parents, child_colors = None, None
+        for parents, illumination, reflection_factor in reversed(levels):
+            color = illumination
+            if child_parents is not None:
+                color[child_parents] += reflection_factor[child_parents] * child_colors
+            child_parents, child_colors = parents, np.clip(color, 0, 1)
+        if child_parents is not None:
+            colors[child_parents] = child_colors
+        return colors
+
+    def pixel_coordinates(self):
+        """
+        每行、每列像素中心的 NDC 坐标
+        :return: (ys, xs)
+        """
+        return np.linspace(self.screen[1], self.screen[3], self.height), np.linspace(self.screen[0], self.screen[2], self.width)
+
+    def __getstate__(self):
+        # 信号对象无法序列化，主图像渲染进程用不到，均不随场景传给渲染进程
+        state = self.__dict__.copy()
+        state['signals'] = None
+        state['image'] = None
+        state['pool'] = None
+        return state
+
+    def stop(self):
+        """
+        中止渐进渲染：当前这一遍完成后不再继续细化，保存已得到的结果
+        """
+        self.stopped = True
+
+    def cancel(self):
+        """
+        取消渲染：不再分派新的块，已排队的块由渲染进程跳过，不保存结果也不发出 finished。
+        可在其他线程中调用，render 在正在渲染的块完成后返回
+        """
+        self.stopped = True
+        self.cancelled = True
+        pool = self.pool
+        if pool is not None:
+            pool.cancel()
+
+    def render(self, spl=3, output='image.png', preview=True, pool=None):
+        """
+        :param output: 结果图片的保存路径，为 None 时不保存
+        :param pool: 常驻的 RenderPool，为 None 时为本次渲染临时创建
+        :return: 渲染是否完成（未被 cancel 取消，也未在第一遍完成前被 stop 停止）
+        """
+        if self.stopped:  # 开始前已经 stop 或 cancel，没有可以保留的结果
+            logger.info("Rendering stopped before it started")
+            return False
+        own_pool = pool is None
+        if own_pool:
+            pool = RenderPool()
+        i_VP = glm.inverse(self.VP)
+        self.build_acceleration()
+        # 小块动态调度：进程每次只取一个块，先完成的进程继续领取剩余的块，末尾不会只剩个别大块拖慢整体
+        tasks = make_tiles(self.height, self.width, self.tile_size)
+        costs = self.estimate_tile_costs(tasks, i_VP) if self.tile_order == 'cost' else None
+        tasks = order_tiles(tasks, self.height, self.width, costs)
+        logger.info(f"Scheduled {len(tasks)} tiles of {self.tile_size}x{self.tile_size} pixels, order: {self.tile_order}")
+        # 纹理在主进程中解码一次，随场景经共享内存传递给渲染进程
+        for obj in self.objects:
+            if obj.texture:
+                obj.get_texture_data()
+        # 渲染遍：非渐进模式只有一遍；渐进模式先是一遍低分辨率预览，之后每遍追加一个子采样
+        if self.progressive:
+            passes = [[(tile, ('preview', self.preview_step)) for tile in tasks]]
+            passes += [[(tile, ('pass', tuple(offset), count)) for tile in tasks]
+                       for count, offset in enumerate(progressive_order(subsample_offsets(spl)), start=1)]
+        else:
+            passes = [[(tile, None) for tile in tasks]]
+        # 多进程渲染，各进程把结果直接写入共享帧缓冲
+        self.stopped = self.stopped or self.cancelled
+        ltasks = sum(len(tiles) for tiles in passes)
+        count = 0
+        done_passes = 0
+        try:
+            self.pool = pool
+            frame = pool.prepare((self, i_VP, spl), self.image, accumulate=self.progressive)
+            if self.cancelled:  # prepare 之前取消的，版本号已更新，需要重新通知
+                pool.cancel()
+            last_update = 0.0
+            for number, tiles in enumerate(passes):
+                if self.stopped:
+                    logger.info(f"Rendering stopped after {number} of {len(passes)} passes")
+                    break
+                for block, remaining in zip(pool.map(tiles), range(len(tiles) - 1, -1, -1)):
+                    if block is None or self.cancelled:
+                        continue
+                    count += 1
+                    progress = (count / ltasks) * 100
+                    logger.debug(f"Completed {count} out of {ltasks} blocks ({progress:.2f}%)")
+
+                    # 块数较多，限制预览图像的更新频率，每一遍结束时总是更新
+                    if remaining == 0 or time.perf_counter() - last_update >= 0.1:
+                        last_update = time.perf_counter()
+                        self.signals.progress_update.emit(progress, np.copy(frame.array))
+                done_passes += 1
+            if not self.cancelled and done_passes:
+                self.image[...] = frame.array
+        finally:
+            self.pool = None
+            if own_pool:
+                pool.close()
+        if self.cancelled:
+            logger.info(f"Rendering cancelled after {count} of {ltasks} blocks")
+            return False
+        if not done_passes:
+            return False
+
+        # 保存最终渲染结果
+        if output is not None:
+            plt.imsave(output, self.image)
+        if preview:
+            Image.fromarray((self.image * 255).astype(np.uint8)).show()
+        self.signals.finished.emit()
+        return True
+
+
+def create_ray_tracer(objects, properties, width=1200, height=1200, light_pos=glm.vec3(-1.0, 3.0, -2.0), light_color=glm.vec3(1.0, 1.0, 1.0), max_depth=5, image=None, **kwargs):
+    """
+    由相机参数与点光源构建 RayTracer
+    :param properties: 相机参数，包含 eye、center、up、fov、near、far
+    :param kwargs: 传给 RayTracer 的其余参数
+    """
+    camera = properties['eye']
+    logger.info(f"Initializing render with width={width}, height={height}, max_depth={max_depth}, camera={camera}, light_pos={light_pos}, light_color={light_color}")
+    image = image if image is not None else np.zeros((height, width, 3))
+    light = {
+        'position': light_pos,
+        'ambient': 1.0 * light_color,
+        'diffuse': 1.0 * light_color,
+        'specular': 1.0 * light_color
+    }
+    screen = (-1, 1, 1, -1)  # left, top, right, bottom
+    proj_matrix = glm.perspective(glm.radians(properties['fov']), width/height, properties['near'], properties['far'])
+    view_matrix = glm.lookAt(camera, properties['center'], properties['up'])
+    return RayTracer(width, height, max_depth, camera, light, objects, screen, image, VP=proj_matrix * view_matrix, **kwargs)
@@ -0,0 +1,229 @@
+'''
+Author: Wh_Xcjm
+Date: 2026-10-18 14:29:51
+LastEditor: Wh_Xcjm
+LastEditTime: 2026-10-18 14:45:53
+FilePath: \大作业\render\shared_scene.py
+Description: 
+
+Copyright (c) 2025 by WhXcjm, All Rights Reserved. 
+Github: https://github.com/WhXcjm
+'''
+import io
+import mmap
+import pickle
+import secrets
+from multiprocessing import shared_memory
+import numpy as np
+
+ALIGNMENT = 64  # 每个数组在共享内存中的起始偏移按缓存行对齐
+
+
+def _release(shm, unlink):
+    """
+    关闭共享内存，仍有视图引用时保留映射，由进程退出时回收
+    """
+    try:
+        shm.close()
+    except BufferError:
+        pass
+    if unlink:
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _file_ref(array):
+    """
+    映射自文件的只读数组（如网格缓存，见 model/obj_loader.py）的引用 ('memmap', 文件名, 文件内偏移, 形状, dtype)，
+    渲染进程直接映射同一文件，无需拷贝进共享内存。无法确定其在文件中位置的数组返回 None
+    """
+    if array.filename is None or array.offset != 0 or array.flags.writeable or not array.flags.c_contiguous:
+        return None
+    base = array
+    while isinstance(base, np.ndarray):
+        base = base.base
+    if not isinstance(base, mmap.mmap):
+        return None
+    offset = array.ctypes.data - np.frombuffer(base, dtype=np.uint8).ctypes.data
+    return ('memmap', array.filename, offset, array.shape, array.dtype.str)
+
+
+class _SharingPickler(pickle.Pickler):
+    """
+    序列化时把较大的 numpy 数组替换为共享内存中的引用 (段名, 偏移, 形状, dtype)。
+    已在之前的场景中共享过且内容未变的数组直接复用原引用，新数组记入待拷贝列表；
+    映射自文件的只读数组则替换为文件引用
+    """
+    def __init__(self, file, store):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.store = store
+        self.segment = f"mrs_{secrets.token_hex(8)}"
+        self.arrays = []  # 本次新增的 (偏移, 数组)
+        self.size = 0
+        self.used = set()  # 本次场景引用到的段
+
+    def persistent_id(self, obj):
+        if not isinstance(obj, np.ndarray) or obj.dtype.hasobject or obj.nbytes < self.store.min_bytes:
+            return None
+        if isinstance(obj, np.memmap):
+            ref = _file_ref(obj)
+            if ref is not None:
+                self.used.add(ref[1])
+                return ref
+        elif type(obj) is not np.ndarray:
+            return None
+        entry = self.store.refs.get(id(obj))
+        if entry is not None and entry[0] is obj and (entry[1][1] == self.segment or self.store.unchanged(obj, entry[1])):
+            ref = entry[1]
+        else:
+            offset = -(-self.size // ALIGNMENT) * ALIGNMENT
+            ref = ('ndarray', self.segment, offset, obj.shape, obj.dtype.str)
+            self.arrays.append((offset, obj))
+            self.size = offset + obj.nbytes
+            self.store.refs[id(obj)] = (obj, ref)  # 同时保持数组存活，避免 id 被复用
+        self.used.add(ref[1])
+        return ref
+
+
+class SharedArrayStore():
+    """
+    渲染进程共享的场景数组仓库（主进程一侧）。
+    每次 share 只把此前未共享过（或内容已变化）的大数组拷贝进一个新的共享内存段，
+    未变化的顶点、纹理、BVH 等数组沿用已有的段，因此反复渲染同一场景时只需传递很小的增量
+    """
+    def __init__(self, min_bytes=4096):
+        self.min_bytes = min_bytes
+        self.segments = {}  # 段名 -> SharedMemory
+        self.refs = {}  # id(数组) -> (数组, 引用)
+        self.copied = 0  # 最近一次 share 新拷贝进共享内存的字节数
+
+    def unchanged(self, array, ref):
+        """
+        数组可能被原地修改，复用前与共享内存中的副本比较
+        """
+        _, segment, offset, shape, dtype = ref
+        if segment not in self.segments or array.shape != shape or array.dtype.str != dtype:
+            return False
+        return np.array_equal(np.ndarray(shape, dtype=np.dtype(dtype), buffer=self.segments[segment].buf, offset=offset), array)
+
+    def share(self, scene):
+        """
+        打包场景（任意可序列化对象），大数组放入共享内存，其余部分序列化为一段很小的字节串
+        :return: (payload, segments)，segments 为还原场景需要的段名列表
+        """
+        file = io.BytesIO()
+        pickler = _SharingPickler(file, self)
+        pickler.dump(scene)
+        self.copied = pickler.size
+        if pickler.arrays:
+            shm = shared_memory.SharedMemory(name=pickler.segment, create=True, size=pickler.size)
+            for offset, array in pickler.arrays:
+                np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf, offset=offset)[...] = array
+            self.segments[pickler.segment] = shm
+
+        # 删除当前场景不再引用的段
+        for name in [name for name in self.segments if name not in pickler.used]:
+            _release(self.segments.pop(name), unlink=True)
+        self.refs = {key: entry for key, entry in self.refs.items() if entry[1][1] in pickler.used}
+        return file.getvalue(), sorted(pickler.used)
+
+    @property
+    def size(self):
+        return sum(shm.size for shm in self.segments.values())
+
+    def release(self):
+        """
+        关闭并删除全部共享内存段
+        """
+        for shm in self.segments.values():
+            _release(shm, unlink=True)
+        self.segments = {}
+        self.refs = {}
+
+
+class _SharingUnpickler(pickle.Unpickler):
+    """
+    反序列化时把共享内存引用还原为直接映射共享内存的只读数组，不发生拷贝
+    """
+    def __init__(self, file, loader):
+        super().__init__(file)
+        self.loader = loader
+
+    def persistent_load(self, pid):
+        kind, segment, offset, shape, dtype = pid
+        if kind == 'memmap':
+            return self.loader.file_view(segment, offset, shape, dtype)
+        if kind != 'ndarray':
+            raise pickle.UnpicklingError(f"Unsupported persistent id: {kind}")
+        return self.loader.view(segment, offset, shape, dtype)
+
+
+class SharedSceneLoader():
+    """
+    渲染进程一侧：还原 SharedArrayStore 打包的场景。已附加的段与数组视图跨场景保留，
+    同一数组在多次渲染间保持为同一对象，依赖对象身份的缓存（如网格 BVH）也随之复用
+    """
+    def __init__(self):
+        self.segments = {}  # 段名 -> SharedMemory
+        self.files = {}  # 文件名 -> 整个文件的只读 np.memmap
+        self.views = {}  # (段名, 偏移) 或 (文件名, 偏移, 形状, dtype) -> 数组
+
+    def view(self, segment, offset, shape, dtype):
+        view = self.views.get((segment, offset))
+        if view is None:
+            if segment not in self.segments:
+                self.segments[segment] = shared_memory.SharedMemory(name=segment)
+            view = np.ndarray(shape, dtype=np.dtype(dtype), buffer=self.segments[segment].buf, offset=offset)
+            view.flags.writeable = False
+            self.views[(segment, offset)] = view
+        return view
+
+    def file_view(self, filename, offset, shape, dtype):
+        key = (filename, offset, shape, dtype)
+        view = self.views.get(key)
+        if view is None:
+            if filename not in self.files:
+                self.files[filename] = np.memmap(filename, dtype=np.uint8, mode='r')
+            dtype = np.dtype(dtype)
+            view = self.files[filename][offset:offset + int(np.prod(shape)) * dtype.itemsize].view(dtype).reshape(shape)
+            self.views[key] = view
+        return view
+
+    def load(self, payload, segments):
+        """
+        :param segments: 场景引用的段名与文件名，其余已附加的段与映射的文件会被释放
+        """
+        for name in [name for name in self.segments if name not in segments]:
+            self.views = {key: view for key, view in self.views.items() if key[0] != name}
+            _release(self.segments.pop(name), unlink=False)
+        for name in [name for name in self.files if name not in segments]:
+            self.views = {key: view for key, view in self.views.items() if key[0] != name}
+            del self.files[name]
+        return _SharingUnpickler(io.BytesIO(payload), self).load()
+
+
+class SharedArray():
+    """
+    直接存放在共享内存中的 numpy 数组（如渲染帧缓冲），各进程读写同一块内存
+    :param name: 为 None 时创建新的共享内存，否则附加到已有的同名共享内存
+    """
+    def __init__(self, shape, dtype=np.float64, name=None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.owner = name is None
+        size = max(1, int(np.prod(self.shape)) * self.dtype.itemsize)
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size if self.owner else 0)
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self.shm.buf)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def release(self):
+        """
+        释放对共享内存的映射，创建者同时删除共享内存。调用前需确保不再持有 array 的视图
+        """
+        self.array = None
+        _release(self.shm, unlink=self.owner)
@@ -0,0 +1,43 @@
+'''
+Author: Wh_Xcjm
+Date: 2026-10-18 15:07:28
+LastEditor: Wh_Xcjm
+LastEditTime: 2026-10-18 15:07:28
+FilePath: \大作业\tests\test_bvh.py
+Description: 
+
+Copyright (c) 2025 by WhXcjm, All Rights Reserved. 
+Github: https://github.com/WhXcjm
+'''
+import numpy as np
+import glm
+from model.shape_generator import ShapeGenerator
+from render.bvh import SceneBVH
+
+
+def closest_t(accel, origin, direction):
+    origins = np.array([origin], dtype=np.float64)
+    directions = np.array([direction], dtype=np.float64)
+    return accel.closest_hit(origins, directions)[1][0]
+
+
+def test_geometry_change_is_not_refitted():
+    cuboid = ShapeGenerator.generate_cuboid(id=0, name="c")
+    accel = SceneBVH([cuboid])
+    assert np.isclose(closest_t(accel, (0, 0, 10), (0, 0, -1)), 9.5)
+
+    larger = ShapeGenerator.generate_cuboid(width=4, height=4, depth=4, id=1, name="l")
+    cuboid.vertices, cuboid.normals, cuboid.indices = larger.vertices, larger.normals, larger.indices
+    assert not accel.matches([cuboid])
+    accel = SceneBVH([cuboid])
+    assert np.isclose(closest_t(accel, (0, 0, 10), (0, 0, -1)), 8.0)
+
+
+def test_moved_object_is_refitted():
+    cuboid = ShapeGenerator.generate_cuboid(id=0, name="c")
+    accel = SceneBVH([cuboid])
+    cuboid.translation = glm.vec3(0, 0, 1)
+    cuboid.update_transform()
+    assert accel.matches([cuboid])
+    assert accel.refit() == 1
+    assert np.isclose(closest_t(accel, (0, 0, 10), (0, 0, -1)), 8.5)
@@ -0,0 +1,72 @@
+'''
+Author: Wh_Xcjm
+Date: 2026-10-18 15:19:15
+LastEditor: Wh_Xcjm
+LastEditTime: 2026-10-18 15:19:15
+FilePath: \大作业\tests\test_obj_loader.py
+Description: 
+
+Copyright (c) 2025 by WhXcjm, All Rights Reserved. 
+Github: https://github.com/WhXcjm
+'''
+import warnings
+import numpy as np
+import pytest
+from model.obj_loader import load_obj_arrays
+
+
+def load(tmp_path, text, **kwargs):
+    path = tmp_path / 'mesh.obj'
+    path.write_text(text)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', DeprecationWarning)
+        return load_obj_arrays(str(path), **kwargs)
+
+
+def corners(vertices, indices):
+    return [[tuple(vertices[i]) for i in triangle] for triangle in indices]
+
+
+def test_inline_comments(tmp_path):
+    vertices, normals, indices, texcoords = load(tmp_path, (
+        "# exported mesh\n"
+        "v 0 0 0 # origin\n"
+        "v 1 0 0\n"
+        "v 0 1 0#no space\n"
+        "f 1 2 3 # triangle\n"))
+    assert corners(vertices, indices) == [[(0, 0, 0), (1, 0, 0), (0, 1, 0)]]
+    assert np.allclose(normals, (0, 0, 1))
+
+
+def test_quad_is_fan_triangulated(tmp_path):
+    vertices, normals, indices, texcoords = load(tmp_path, "v 0 0 0\nv 1 0 0\nv 1 1 0\nv 0 1 0\nf 1 2 3 4\n")
+    assert corners(vertices, indices) == [[(0, 0, 0), (1, 0, 0), (1, 1, 0)], [(0, 0, 0), (1, 1, 0), (0, 1, 0)]]
+
+
+def test_negative_indices(tmp_path):
+    text = "v 0 0 0\nv 1 0 0\nv 0 1 0\nvt 0.5 0.5\nf -3/-1 -2/-1 -1/-1\nv 0 0 1\nf -4 -3 -1\n"
+    vertices, normals, indices, texcoords = load(tmp_path, text)
+    assert corners(vertices, indices) == [[(0, 0, 0), (1, 0, 0), (0, 1, 0)], [(0, 0, 0), (1, 0, 0), (0, 0, 1)]]
+    assert np.allclose(texcoords[indices[0]], 0.5)
+
+
+def test_mixed_face_formats(tmp_path):
+    text = ("v 0 0 0\nv 1 0 0\nv 0 1 0\nv 1 1 0\n"
+            "vt 0.25 0.75\nvn 0 0 -1\n"
+            "f 1/1 2/1 3/1\n"
+            "f 2//1 4//1 3//1\n"
+            "f 1 2/1 3/1/1\n")
+    vertices, normals, indices, texcoords = load(tmp_path, text, chunk_size=40)
+    assert len(indices) == 3
+    triangles = corners(vertices, indices)
+    assert triangles[1] == [(1, 0, 0), (1, 1, 0), (0, 1, 0)]
+    # 给出 vt / vn 的角使用文件中的值，缺少的回退为 (0, 0) 与计算出的顶点法线
+    assert np.allclose(texcoords[indices[0]], (0.25, 0.75))
+    assert np.allclose(texcoords[indices[1]], 0.0)
+    assert np.allclose(normals[indices[1]], (0, 0, -1))
+    assert np.allclose(normals[indices[0]], (0, 0, 1))
+
+
+def test_missing_element_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        load(tmp_path, "v 0 0 0\nv 1 0 0\nf 1 2 -3\n")
@@ -0,0 +1,53 @@
+'''
+Author: Wh_Xcjm
+Date: 2026-10-18 15:09:06
+LastEditor: Wh_Xcjm
+LastEditTime: 2026-10-18 15:21:09
+FilePath: \大作业\tests\test_objects.py
+Description: 
+
+Copyright (c) 2025 by WhXcjm, All Rights Reserved. 
+Github: https://github.com/WhXcjm
+'''
+import glm
+from PIL import Image
+import model.objects as objects
+from model.shape_generator import ShapeGenerator
+
+
+class EditDuringTranslate():
+    """
+    在 update_transform 计算矩阵的过程中修改物体平移，模拟界面线程与渲染线程同时访问
+    """
+    def __init__(self, obj, translation):
+        self.obj = obj
+        self.translation = translation
+
+    def __getattr__(self, name):
+        return getattr(glm, name)
+
+    def translate(self, *args):
+        if self.translation is not None:
+            self.obj.translation, self.translation = self.translation, None
+        return glm.translate(*args)
+
+
+def test_edit_during_update_is_not_lost(monkeypatch):
+    cuboid = ShapeGenerator.generate_cuboid(id=0, name="c")
+    cuboid.translation = glm.vec3(1, 0, 0)
+    monkeypatch.setattr(objects, 'glm', EditDuringTranslate(cuboid, glm.vec3(2, 0, 0)))
+    stale = cuboid.transform  # 以修改前的平移计算，不能留在缓存中
+    monkeypatch.setattr(objects, 'glm', glm)
+    assert stale[3].x == 1
+    assert cuboid.transform[3].x == 2
+    assert cuboid.inverse_transform[3].x == -2
+
+
+def test_texture_edited_on_disk_is_reloaded(tmp_path):
+    path = tmp_path / "tex.png"
+    Image.new('RGB', (2, 2), (255, 0, 0)).save(path)
+    cuboid = ShapeGenerator.generate_cuboid(id=0, name="c")
+    cuboid.texture = str(path)
+    assert tuple(cuboid.get_texture_data()[0, 0]) == (255, 0, 0)
+    Image.new('RGB', (3, 3), (0, 0, 255)).save(path)
+    assert tuple(cuboid.get_texture_data()[0, 0]) == (0, 0, 255)
@@ -0,0 +1,33 @@
+'''
+Author: Wh_Xcjm
+Date: 2026-10-18 15:22:56
+LastEditor: Wh_Xcjm
+LastEditTime: 2026-10-18 15:22:56
+FilePath: \大作业\tests\test_render.py
+Description: 
+
+Copyright (c) 2025 by WhXcjm, All Rights Reserved. 
+Github: https://github.com/WhXcjm
+'''
+import glm
+from model.shape_generator import ShapeGenerator
+from render.core import create_ray_tracer
+
+
+class UnusedPool():
+    """
+    渲染进程池的替身，任何使用都视为开始了追踪
+    """
+    def __getattr__(self, name):
+        raise AssertionError(f"render pool used: {name}")
+
+
+def test_stop_before_render_skips_tracing(tmp_path):
+    properties = {'eye': glm.vec3(0, 0, 3), 'center': glm.vec3(0, 0, 0), 'up': glm.vec3(0, 1, 0),
+                  'fov': 60.0, 'near': 0.1, 'far': 100.0}
+    ray_tracer = create_ray_tracer([ShapeGenerator.generate_cuboid(id=0, name="c")], properties, width=8, height=8)
+    ray_tracer.stop()
+    output = tmp_path / "image.png"
+    assert ray_tracer.render(output=str(output), preview=False, pool=UnusedPool()) is False
+    assert not output.exists()
+    assert not ray_tracer.image.any()